@@ -0,0 +1,651 @@
+'''
+Benchmarks, run with `python go.py --benchmark`, optionally naming scenarios to run.
+
+Each scenario returns a list of measurements, `dict`s with:
+- `name`: unique across scenarios, used to match against a baseline
+- `seconds`: best wall-clock time for what was measured
+- `ops`: how many operations that was, reported as ops/s
+- `bytes`: how many bytes that processed, reported as MB/s
+- anything else, reported as is, and checked against a baseline if it's in `lower_is_better`
+
+Each scenario runs in a fresh process, so the peak RSS reported with it is its own.
+Results can be saved as JSON and compared against a saved baseline, failing if anything regressed by more than a threshold.
+
+Synthetic PDFs are generated with this package so they exercise the same code paths as the reference PDFs, just at larger scale.
+'''
+
+import pdf
+from pdf import _batch, _diff
+from pdf._objects import Name, Ref, Stream, decode_streams, flate_streams
+from pdf._parser import Parser
+from pdf._pdf import Trailer, Xref, XrefTable
+from pdf._to_bytes import to_bytes
+
+import base64
+import concurrent.futures
+import glob
+import json
+import os
+import platform
+import random
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+
+def synthesize(file_name, object_count, depth=0, stream_size=None):
+    '''
+    Write a form-like PDF with roughly `object_count` objects.
+    With `depth`, each field gets an entry nested that deep in alternating arrays and dictionaries.
+    With `stream_size`, appearance streams are that many bytes before compression, and compressed.
+    '''
+    p = pdf.Pdf()
+    p.header = ['PDF-1.6']
+    p.objects[Ref(1)] = {
+        'Type': Name('Catalog'),
+        'AcroForm': {
+            'DR': {'Font': {'Helv': Ref(2)}},
+            'DA': '/Helv 0 Tf 0 g',
+            'Fields': [Ref(i) for i in range(3, object_count, 2)],
+        },
+    }
+    p.objects[Ref(2)] = {
+        'Type': Name('Font'),
+        'Subtype': Name('Type1'),
+        'BaseFont': Name('Helvetica'),
+    }
+    random.seed(0)
+    for i in range(3, object_count, 2):
+        field = {
+            'Type': Name('Annot'),
+            'Subtype': Name('Widget'),
+            'FT': Name('Tx'),
+            'T': 'field {}'.format(i),
+            'Rect': [10, 20.5, 110, 40.25],
+            'DA': '/Helv 0 Tf 0 g',
+            'F': 4,
+            'AP': {'N': Ref(i + 1)},
+        }
+        if depth:
+            nested = i
+            for j in range(depth): nested = [nested] if j % 2 else {'N': nested}
+            field['Nested'] = nested
+        p.objects[Ref(i)] = field
+        content = 'BT /Helv 12 Tf 1 0 0 1 2 4 Tm (field {}) Tj ET'.format(i).encode()
+        if stream_size:
+            words = [b'q', b'Q', b'BT', b'ET', b'1 0 0 1 2 4 Tm', b'(value) Tj', b're f', b'0 g']
+            content = b' '.join(random.choice(words) for _ in range(stream_size // 5))[:stream_size]
+            content = zlib.compress(content)
+            p.objects[Ref(i + 1)] = Stream({'Length': len(content), 'Filter': Name('FlateDecode')}, content)
+        else:
+            p.objects[Ref(i + 1)] = Stream({'Length': len(content)}, content)
+    for k in p.objects:
+        p.xref[k.object_number] = Xref(0, 0, 'n')
+    p.trailer = [Trailer({'Size': len(p.objects) + 1, 'Root': Ref(1)}, 0)]
+    p.save(file_name)
+
+def time_it(f, repeat=3):
+    'Best of `repeat` wall-clock seconds for `f()`.'
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best: best = elapsed
+    return best
+
+def reference_pdfs(suffix='i'):
+    return sorted(glob.glob(os.path.join(DIR, 'reference-pdfs', '*{}.pdf'.format(suffix))))
+
+#===== scenarios =====#
+def load(object_counts=(1000, 4000, 16000)):
+    'Full loads of synthetic PDFs of increasing size; MB/s should stay roughly flat.'
+    result = []
+    with tempfile.TemporaryDirectory() as directory:
+        for object_count in object_counts:
+            file_name = os.path.join(directory, '{}.pdf'.format(object_count))
+            synthesize(file_name, object_count)
+            result.append({
+                'name': 'load/{}'.format(object_count),
+                'seconds': time_it(lambda: pdf.Pdf().load(file_name)),
+                'ops': object_count,
+                'bytes': os.path.getsize(file_name),
+            })
+        file_name = os.path.join(directory, 'deep.pdf')
+        synthesize(file_name, 2000, depth=64)
+        result.append({
+            'name': 'load/deep',
+            'seconds': time_it(lambda: pdf.Pdf().load(file_name)),
+            'ops': 2000,
+            'bytes': os.path.getsize(file_name),
+        })
+        file_name = os.path.join(directory, 'streams.pdf')
+        synthesize(file_name, 64, stream_size=1 << 20)
+        result.append({
+            'name': 'load/big_streams',
+            'seconds': time_it(lambda: pdf.Pdf().load(file_name)),
+            'ops': 64,
+            'bytes': os.path.getsize(file_name),
+        })
+    return result
+
+def lazy_open(object_count=16000):
+    'What the viewer does on open: `Pdf.load(lazy=True)` followed by `Pdf.root`.'
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'lazy.pdf')
+        synthesize(file_name, object_count)
+        return [{
+            'name': 'lazy_open/{}'.format(object_count),
+            'seconds': time_it(lambda: pdf.Pdf().load(file_name, lazy=True).root()),
+            'ops': 1,
+            'bytes': os.path.getsize(file_name),
+        }]
+
+parse_samples = {
+    'dictionary': b'<< /Type /Annot /Subtype /Widget /FT /Tx /Rect [ 10 20.5 110 40.25 ] /F 4 /AP << /N 12 0 R >> >>',
+    'array': b'[ 1 2 3 4.5 /Name (string) 12 0 R true false null [ 1 2 ] ]',
+    'string': b'(a string with \\(escapes\\) and \\\\ backslashes and \\101 octal)',
+    'hex_string': b'<' + b'0123456789ABCDEF' * 8 + b'>',
+    'numbers': b'[ ' + b' '.join(str(i * 7).encode() for i in range(64)) + b' ]',
+    'deep': b'[ ' * 64 + b'1' + b' ]' * 64,
+}
+
+def parse_object(repeat=2000):
+    'Microbenchmarks of `Parser.parse_object` on typical tokens.'
+    result = []
+    for name, sample in parse_samples.items():
+        def f():
+            for _ in range(repeat): Parser(sample).parse_object()
+        result.append({
+            'name': 'parse_object/{}'.format(name),
+            'seconds': time_it(f),
+            'ops': repeat,
+            'bytes': repeat * len(sample),
+        })
+    return result
+
+def strings(size=1 << 20):
+    'Parsing and serializing long strings, like embedded XMP and signatures.'
+    random.seed(0)
+    text = ''.join(random.choice(string.ascii_letters + ' ()\\\n') for _ in range(size))
+    binary = bytes(random.getrandbits(8) for _ in range(size)).decode('latin-1')
+    samples = {
+        'literal': to_bytes(text),
+        'hex': to_bytes(binary),
+    }
+    result = []
+    for name, sample in samples.items():
+        result.append({
+            'name': 'strings/parse/{}'.format(name),
+            'seconds': time_it(lambda: Parser(sample).parse_object()),
+            'ops': 1,
+            'bytes': len(sample),
+        })
+    for name, x in [('literal', text), ('hex', binary)]:
+        result.append({
+            'name': 'strings/to_bytes/{}'.format(name),
+            'seconds': time_it(lambda: to_bytes(x)),
+            'ops': 1,
+            'bytes': len(x),
+        })
+    return result
+
+def stream_decode(size=16 << 20):
+    'Decoding a large Flate stream, whole and in chunks, and many streams serially and in parallel.'
+    random.seed(0)
+    words = [b'q', b'Q', b'BT', b'ET', b'1 0 0 1 2 4 Tm', b'(value) Tj', b're f', b'0 g']
+    content = b' '.join(random.choice(words) for _ in range(size // 5))[:size]
+    compressed = zlib.compress(content)
+    def decoded():
+        Stream({'Filter': Name('FlateDecode')}, compressed).decoded
+    def iter_decoded():
+        for _ in Stream({'Filter': Name('FlateDecode')}, compressed).iter_decoded(): pass
+    # the same data split across streams, decoded and encoded a stream at a time and on a thread per CPU
+    count = 64
+    chunks = [content[i:i + size // count] for i in range(0, size, size // count)]
+    compressed_chunks = [zlib.compress(i) for i in chunks]
+    def streams(): return [Stream({'Filter': Name('FlateDecode')}, i) for i in compressed_chunks]
+    def serial():
+        for i in streams(): i.decoded
+    def plain(): return [Stream({}, i) for i in chunks]
+    def flate_serial():
+        for i in plain(): flate_streams([i], workers=1)
+    return [
+        {'name': 'stream_decode/decoded', 'seconds': time_it(decoded), 'ops': 1, 'bytes': size},
+        {'name': 'stream_decode/iter_decoded', 'seconds': time_it(iter_decoded), 'ops': 1, 'bytes': size},
+        {'name': 'stream_decode/serial', 'seconds': time_it(serial), 'ops': count, 'bytes': size},
+        {'name': 'stream_decode/parallel', 'seconds': time_it(lambda: decode_streams(streams())), 'ops': count, 'bytes': size},
+        {'name': 'stream_encode/serial', 'seconds': time_it(flate_serial), 'ops': count, 'bytes': size},
+        {'name': 'stream_encode/parallel', 'seconds': time_it(lambda: flate_streams(plain())), 'ops': count, 'bytes': size},
+    ]
+
+def png_up(data, row_size):
+    'Encode `data` with the PNG Up predictor on every row, a column at a time.'
+    rows = len(data) // row_size
+    result = bytearray(rows * (row_size + 1))
+    result[0::row_size + 1] = b'\x02' * rows
+    for column in range(row_size):
+        x = data[column::row_size]
+        result[column + 1::row_size + 1] = bytes(map((255).__and__, map(int.__sub__, x, b'\0' + x[:-1])))
+    return bytes(result)
+
+def png_sub(data, row_size, bpp):
+    'Encode `data` with the PNG Sub predictor on every row.'
+    result = bytearray()
+    for start in range(0, len(data), row_size):
+        row = data[start:start + row_size]
+        result.append(1)
+        result += bytes(map((255).__and__, map(int.__sub__, row, bytes(bpp) + row[:-bpp])))
+    return bytes(result)
+
+def filters(entry_count=200000, image_size=512):
+    '''
+    Decoding a cross-reference stream with `/Predictor 12`, as most PDF writers make them,
+    images with PNG and TIFF predictors, and the ASCII filters.
+    '''
+    random.seed(0)
+    result = []
+    xref = XrefTable()
+    offset = 0
+    for i in range(1, entry_count):
+        offset += random.randint(20, 2000)
+        xref[i] = Xref(offset, 0, 'n')
+    rows, widths = xref.to_stream(entry_count)
+    row_size = sum(widths)
+    stream = Stream({
+        'Type': Name('XRef'),
+        'Size': entry_count,
+        'W': widths,
+        'Filter': Name('FlateDecode'),
+        'DecodeParms': {'Predictor': 12, 'Columns': row_size},
+    }, zlib.compress(png_up(rows, row_size)))
+    def decode_xref():
+        stream._decoded = pdf._objects._undecoded
+        XrefTable.from_stream(stream)
+    result.append({'name': 'filters/xref/png_up', 'seconds': time_it(decode_xref), 'ops': entry_count, 'bytes': len(rows)})
+    # a photo-like RGB image: smooth gradients plus noise
+    row_size = image_size * 3
+    image = bytes(
+        (x + y + c * 40 + random.randint(0, 8)) & 255
+        for y in range(image_size)
+        for x in range(image_size)
+        for c in range(3)
+    )
+    parms = {'Colors': 3, 'Columns': image_size}
+    tiff = bytearray(image)
+    for start in range(0, len(image), row_size):
+        row = image[start:start + row_size]
+        tiff[start:start + row_size] = bytes(map((255).__and__, map(int.__sub__, row, bytes(3) + row[:-3])))
+    for name, encoded, predictor in [
+        ('png_up', png_up(image, row_size), 12),
+        ('png_sub', png_sub(image, row_size, 3), 11),
+        ('tiff', bytes(tiff), 2),
+    ]:
+        image_stream = Stream({'Filter': Name('FlateDecode'), 'DecodeParms': dict(parms, Predictor=predictor)}, zlib.compress(encoded))
+        def decode_image():
+            image_stream._decoded = pdf._objects._undecoded
+            assert image_stream.decoded == image
+        result.append({'name': 'filters/image/{}'.format(name), 'seconds': time_it(decode_image), 'ops': 1, 'bytes': len(image)})
+    for name, encoded in [
+        ('ASCIIHexDecode', image.hex().encode() + b'>'),
+        ('ASCII85Decode', base64.a85encode(image, wrapcol=80, adobe=True)),
+    ]:
+        ascii_stream = Stream({'Filter': Name(name)}, encoded)
+        def decode_ascii():
+            ascii_stream._decoded = pdf._objects._undecoded
+            ascii_stream.decoded
+        result.append({'name': 'filters/{}'.format(name), 'seconds': time_it(decode_ascii), 'ops': 1, 'bytes': len(image)})
+    return result
+
+def serialize(object_count=16000):
+    '`to_bytes` on every object, and `Pdf.save`, full and compressed.'
+    result = []
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'serialize.pdf')
+        synthesize(file_name, object_count)
+        p = pdf.Pdf().load(file_name)
+        objects = list(p.objects.values())
+        size = sum(len(to_bytes(i)) for i in objects)
+        result.append({
+            'name': 'to_bytes/{}'.format(object_count),
+            'seconds': time_it(lambda: [to_bytes(i) for i in objects]),
+            'ops': len(objects),
+            'bytes': size,
+        })
+        for compress in [False, True]:
+            output = os.path.join(directory, 'saved.pdf')
+            seconds = time_it(lambda: p.save(output, compress=compress))
+            result.append({
+                'name': 'save/{}{}'.format(object_count, '/compressed' if compress else ''),
+                'seconds': seconds,
+                'ops': len(objects),
+                'bytes': os.path.getsize(output),
+            })
+        # a fresh load each time, since a save leaves nothing dirty to write again
+        output = os.path.join(directory, 'incremental.pdf')
+        seconds = None
+        for _ in range(3):
+            p = pdf.Pdf().load(file_name)
+            p.touch(p.root())
+            start = time.perf_counter()
+            p.save(output, incremental=True)
+            elapsed = time.perf_counter() - start
+            if seconds is None or elapsed < seconds: seconds = elapsed
+        result.append({
+            'name': 'save/{}/incremental'.format(object_count),
+            'seconds': seconds,
+            'ops': 1,
+            'bytes': os.path.getsize(output),
+        })
+    return result
+
+def optimize(object_counts=(4000, 16000)):
+    '`Pdf.optimize` on synthetic PDFs with a quarter of their streams orphaned and a quarter duplicated; ops/s should stay roughly flat.'
+    result = []
+    with tempfile.TemporaryDirectory() as directory:
+        for object_count in object_counts:
+            file_name = os.path.join(directory, 'optimize.pdf')
+            synthesize(file_name, object_count, stream_size=256)
+            def f():
+                p = pdf.Pdf().load(file_name)
+                refs = [k for k, v in p.objects.items() if isinstance(v, Stream)]
+                for i, k in enumerate(refs):
+                    if i % 4 == 1: p.objects[Ref(object_count + i)] = p.objects[k]
+                    if i % 4 == 2: p.objects[k] = p.objects[refs[i - 1]]
+                return p
+            seconds = None
+            for _ in range(3):
+                p = f()
+                start = time.perf_counter()
+                p.optimize()
+                elapsed = time.perf_counter() - start
+                if seconds is None or elapsed < seconds: seconds = elapsed
+            result.append({
+                'name': 'optimize/{}'.format(object_count),
+                'seconds': seconds,
+                'ops': len(f().objects),
+                'bytes': os.path.getsize(file_name),
+            })
+    return result
+
+def templatify():
+    '`Pdf.templatify_forms` on each reference PDF; ops are fields.'
+    result = []
+    for file_name in reference_pdfs():
+        # time only the templatify, on a fresh load each time
+        best = None
+        for _ in range(3):
+            p = pdf.Pdf().load(file_name)
+            fields = len(p.index.fields())
+            start = time.perf_counter()
+            p.templatify_forms()
+            seconds = time.perf_counter() - start
+            if best is None or seconds < best: best = seconds
+        result.append({
+            'name': 'templatify/{}'.format(os.path.basename(file_name)),
+            'seconds': best,
+            'ops': fields,
+        })
+    return result
+
+def variants(count=20):
+    'Templatify `count` variants of each reference PDF, each from a fresh load and each from a `Pdf.clone` of one load; ops are variants.'
+    result = []
+    for file_name in reference_pdfs():
+        def loaded():
+            for _ in range(count): pdf.Pdf().load(file_name).templatify_forms()
+        def cloned():
+            p = pdf.Pdf().load(file_name)
+            for _ in range(count): p.clone().templatify_forms()
+        for name, f in [('load', loaded), ('clone', cloned)]:
+            result.append({
+                'name': 'variants/{}/{}'.format(name, os.path.basename(file_name)),
+                'seconds': time_it(f),
+                'ops': count,
+            })
+    return result
+
+def template_fill(fills=1000):
+    'Fill each templatified reference PDF with distinct values, `fills` times.'
+    result = []
+    for file_name in reference_pdfs():
+        p = pdf.Pdf().load(file_name)
+        p.templatify_forms()
+        template = pdf.CompiledTemplate(p)
+        values = [
+            {k: 'Yes' if v[0].kind == 'b' else 'value {} {}'.format(k, i) for k, v in template.fields.items()}
+            for i in range(fills)
+        ]
+        def f():
+            for i in values: template.fill(i)
+        result.append({
+            'name': 'template_fill/{}'.format(os.path.basename(file_name)),
+            'seconds': time_it(f, repeat=1),
+            'ops': fills,
+            'bytes': fills * len(template.template),
+        })
+    return result
+
+def compare(object_count=16000):
+    '`_diff.diff` between a synthetic PDF and a copy with a few changes.'
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'compare.pdf')
+        synthesize(file_name, object_count)
+        a = pdf.Pdf().load(file_name)
+        b = pdf.Pdf().load(file_name)
+        refs = list(b.objects)
+        for i in range(3, len(refs), len(refs) // 10):
+            if type(b.objects[refs[i]]) == dict: b.objects[refs[i]]['F'] = 0
+        return [{
+            'name': 'compare/{}'.format(object_count),
+            'seconds': time_it(lambda: list(_diff.diff(a, b))),
+            'ops': object_count,
+            'bytes': os.path.getsize(file_name),
+        }]
+
+def batch(repeat=8):
+    '''
+    Templatify the reference PDFs `repeat` times each with `_batch.run` at increasing worker counts.
+    Each job uses a distinct uniquifier so the per-worker template cache doesn't hide the work.
+    Jobs/s should grow close to linearly up to the number of cores.
+    '''
+    result = []
+    jobs = [
+        {'pdf': file_name, 'templatify': True, 'uniquifier': 'u{}'.format(i)}
+        for i in range(repeat)
+        for file_name in reference_pdfs()
+    ]
+    workers = 1
+    while True:
+        start = time.perf_counter()
+        results = list(_batch.run(jobs, workers))
+        seconds = time.perf_counter() - start
+        assert not any('error' in i for i in results)
+        result.append({'name': 'batch/{}'.format(workers), 'seconds': seconds, 'ops': len(jobs)})
+        if workers >= (os.cpu_count() or 1): break
+        workers = min(workers * 2, os.cpu_count())
+    return result
+
+def xref(entry_counts=(10000, 1000000)):
+    'Round-trip cross-reference tables and streams through `XrefTable`, and memory per entry.'
+    result = []
+    for entry_count in entry_counts:
+        tracemalloc.start()
+        table = XrefTable()
+        table.update((i, Xref(i * 100, 0, 'n')) for i in range(1, entry_count))
+        allocated = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        chunks = []
+        table.write_table(chunks.append)
+        written = b'xref\n' + b''.join(chunks) + b'trailer'
+        rows, w = table.to_stream(entry_count)
+        stream = Stream({'W': w, 'Size': entry_count}, rows)
+        assert list(XrefTable.from_stream(stream).fields) == list(table.fields)
+        name = 'xref/{}'.format(entry_count)
+        result.extend([
+            {
+                'name': name + '/table_write',
+                'seconds': time_it(lambda: table.write_table(lambda x: None)),
+                'ops': entry_count,
+                'bytes': len(written),
+                'bytes_per_entry': allocated / entry_count,
+            },
+            {
+                'name': name + '/table_read',
+                'seconds': time_it(lambda: pdf.Pdf()._parse_xref_table(Parser(written))),
+                'ops': entry_count,
+                'bytes': len(written),
+            },
+            {
+                'name': name + '/stream_write',
+                'seconds': time_it(lambda: table.to_stream(entry_count)),
+                'ops': entry_count,
+                'bytes': len(rows),
+            },
+            {
+                'name': name + '/stream_read',
+                'seconds': time_it(lambda: XrefTable.from_stream(stream)),
+                'ops': entry_count,
+                'bytes': len(rows),
+            },
+        ])
+    return result
+
+def instance_size(x):
+    'Bytes for `x` itself plus its `__dict__`, if it has one.'
+    return sys.getsizeof(x) + (sys.getsizeof(x.__dict__) if hasattr(x, '__dict__') else 0)
+
+def memory():
+    'Bytes per instance of the small, numerous classes, and bytes allocated by `Pdf.load` per object for each reference PDF.'
+    result = []
+    for i in [Name('Widget'), Ref(1), Xref(0, 0, 'n'), Trailer({}, 0)]:
+        result.append({'name': 'memory/{}'.format(type(i).__name__), 'bytes_per_object': instance_size(i)})
+    for file_name in reference_pdfs(''):
+        tracemalloc.start()
+        p = pdf.Pdf().load(file_name)
+        allocated = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        result.append({
+            'name': 'memory/{}'.format(os.path.basename(file_name)),
+            'objects': len(p.objects),
+            'bytes_per_object': allocated / len(p.objects),
+        })
+    return result
+
+def mapped(object_count=2000, stream_size=1 << 16):
+    'Load, modify one object and save, with the file read and memory-mapped; peak bytes allocated should drop by about the file size.'
+    result = []
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'mapped.pdf')
+        synthesize(file_name, object_count, stream_size=stream_size)
+        size = os.path.getsize(file_name)
+        output = os.path.join(directory, 'saved.pdf')
+        for mapped in [False, True]:
+            def f():
+                p = pdf.Pdf().load(file_name, mapped=mapped)
+                p.object(1)['Modified'] = True
+                p.touch(1)
+                p.save(output)
+            seconds = time_it(f)
+            tracemalloc.start()
+            f()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            result.append({
+                'name': 'mapped/{}'.format('mmap' if mapped else 'read'),
+                'seconds': seconds,
+                'ops': 1,
+                'bytes': size,
+                'peak_allocated_mb': peak / (1 << 20),
+            })
+    return result
+
+scenarios = {
+    i.__name__: i
+    for i in [load, lazy_open, parse_object, strings, stream_decode, filters, serialize, optimize, templatify, variants, template_fill, compare, batch, xref, memory, mapped]
+}
+
+#===== running =====#
+higher_is_better = ['ops_per_second', 'mb_per_second']
+lower_is_better = ['peak_rss_mb', 'bytes_per_object', 'bytes_per_entry', 'peak_allocated_mb']
+
+def peak_rss_mb():
+    if not resource: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+def run_scenario(name):
+    'Run scenario `name` and derive rates. Meant to run in its own process.'
+    measurements = scenarios[name]()
+    peak = peak_rss_mb()
+    for i in measurements:
+        i['scenario'] = name
+        if i.get('seconds'):
+            if 'ops' in i: i['ops_per_second'] = i['ops'] / i['seconds']
+            if 'bytes' in i: i['mb_per_second'] = i['bytes'] / i['seconds'] / (1 << 20)
+        if peak is not None: i['peak_rss_mb'] = peak
+    return measurements
+
+def print_measurement(i):
+    print('{:<40} {:>10} {:>12} {:>10} {:>10}{}'.format(
+        i['name'],
+        '{:.4f}'.format(i['seconds']) if 'seconds' in i else '',
+        '{:.1f}'.format(i['ops_per_second']) if 'ops_per_second' in i else '',
+        '{:.2f}'.format(i['mb_per_second']) if 'mb_per_second' in i else '',
+        '{:.1f}'.format(i['peak_rss_mb']) if 'peak_rss_mb' in i else '',
+        ''.join(' {}={:.1f}'.format(k, i[k]) for k in ['bytes_per_object', 'bytes_per_entry', 'peak_allocated_mb'] if k in i),
+    ))
+
+def regressions(results, baseline, threshold):
+    'Descriptions of measurements in `results` that are worse than in `baseline` by more than `threshold`, a fraction.'
+    old = {i['name']: i for i in baseline['results']}
+    result = []
+    for new in results:
+        if new['name'] not in old: continue
+        for k in higher_is_better + lower_is_better:
+            if k not in new or not old[new['name']].get(k): continue
+            change = new[k] / old[new['name']][k] - 1
+            if (k in higher_is_better and change < -threshold) or (k in lower_is_better and change > threshold):
+                result.append('{} {}: {:.2f} -> {:.2f} ({:+.0%})'.format(new['name'], k, old[new['name']][k], new[k], change))
+    return result
+
+def run(names=None, output=None, baseline=None, threshold=0.25):
+    '''
+    Run scenarios `names` (default: all), each in a fresh process, and print measurements as they come.
+    With `output`, save results as JSON there. With `baseline`, a file saved that way, report regressions.
+    Returns the number of regressions.
+    '''
+    results = []
+    print('{:<40} {:>10} {:>12} {:>10} {:>10}'.format('name', 'seconds', 'ops/s', 'MB/s', 'peak MB'))
+    for name in names or scenarios:
+        if name not in scenarios: raise Exception('unknown scenario {}, expected one of {}'.format(name, ', '.join(scenarios)))
+        print('===== {} ====='.format(name))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+            measurements = executor.submit(run_scenario, name).result()
+        for i in measurements: print_measurement(i)
+        results.extend(measurements)
+    document = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    if output:
+        with open(output, 'w') as file: json.dump(document, file, indent=2)
+    if not baseline: return 0
+    with open(baseline) as file: found = regressions(results, json.load(file), threshold)
+    print('===== regressions beyond {:.0%} ====='.format(threshold))
+    for i in found: print(i)
+    if not found: print('none')
+    return len(found)
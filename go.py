@@ -4,22 +4,28 @@ import argparse
 import glob
 import os
 import shutil
-import subprocess
+import sys
 import webbrowser
 
 DIR = os.path.dirname(__file__)
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--browser', '-b', action='store_true')
-parser.add_argument('--server', '-s', action='store_true')
+parser.add_argument('--server', '-s', nargs='?', const='.', metavar='DIR', help='serve the viewer in index.html for PDFs under DIR, default the current directory, see pdf/_server.py')
+parser.add_argument('--port', type=int, default=8000)
 parser.add_argument('--test', '-t', action='store_true')
+parser.add_argument('--benchmark', nargs='*', metavar='SCENARIO', help='run benchmark scenarios, all by default, see benchmark.py')
+parser.add_argument('--benchmark-output', help='save benchmark results as JSON')
+parser.add_argument('--benchmark-baseline', help='benchmark results saved by --benchmark-output to check for regressions against')
+parser.add_argument('--benchmark-threshold', type=float, default=0.25, help='fraction a measurement can worsen by before it counts as a regression')
 args = parser.parse_args()
 
 if args.browser:
-    webbrowser.open_new_tab(os.path.join(DIR, 'index.html'))
+    webbrowser.open_new_tab('http://localhost:{}/'.format(args.port) if args.server else os.path.join(DIR, 'index.html'))
 
 if args.server:
-    subprocess.check_call(['python', '-u', 'py-rpc-host', 'pdf'])
+    from pdf import _server
+    _server.serve(args.server, port=args.port)
 
 if args.test:
     def compare(a, b):
@@ -37,3 +43,13 @@ if args.test:
         if not compare(truncated+'o.pdf', test_file_name):
             print('error: not idempotent')
         os.remove(test_file_name)
+
+if args.benchmark is not None:
+    import benchmark
+    regressions = benchmark.run(
+        args.benchmark,
+        output=args.benchmark_output,
+        baseline=args.benchmark_baseline,
+        threshold=args.benchmark_threshold,
+    )
+    if regressions: sys.exit(1)
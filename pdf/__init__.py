@@ -5,3 +5,6 @@ http://wwwimages.adobe.com/www.adobe.com/content/dam/acom/en/devnet/pdf/pdfs/PDF
 '''
 
 from ._pdf import Pdf
+from ._template import CompiledTemplate
+from ._cache import Cache
+from ._stats import Stats
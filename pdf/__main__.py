@@ -1,13 +1,15 @@
 import argparse
+import json
 import os
 import sys
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from pdf import Pdf
+from pdf import Cache, Pdf, Stats, _batch, _daemon, _diff, _stats
 
 parser = argparse.ArgumentParser()
-parser.add_argument('pdf')
-parser.add_argument('--compare', '-c')
+parser.add_argument('pdf', nargs='?', help='PDF file name, or with --batch, a glob or a JSONL manifest (see pdf/_batch.py)')
+parser.add_argument('--compare', '-c', help='print differences from this PDF, one per line as "ref path: old -> new"')
+parser.add_argument('--json', action='store_true', help='with --compare, print differences as JSON')
 parser.add_argument('--templatify-forms', '-t', action='store_true')
 parser.add_argument('--templatify-forms-whitelist', '--tfw', default='')
 parser.add_argument('--templatify-forms-uniquifier', '--tfu')
@@ -15,34 +17,71 @@ parser.add_argument('--templatify-forms-padding', '--tfp', type=int, default=80)
 parser.add_argument('--templatify-forms-custom-padding', '--tfcp', default='{}')
 parser.add_argument('--templatify-forms-remove-dv', '--tfrd', action='store_true')
 parser.add_argument('--save', '-s')
-args = parser.parse_args()
+parser.add_argument('--incremental', '-i', action='store_true')
+parser.add_argument('--compress', action='store_true', help='save with object streams and a cross-reference stream')
+parser.add_argument('--recompress', type=int, metavar='LEVEL', help='compress streams without a filter at this zlib level before saving')
+parser.add_argument('--optimize', '-O', action='store_true', help='drop unreachable and duplicate objects and renumber before saving')
+parser.add_argument('--cache', help='directory to cache parsed PDFs in')
+parser.add_argument('--batch', '-b', action='store_true', help='with a glob, --save is a directory')
+parser.add_argument('--workers', '-w', type=int, help='batch or daemon worker processes, defaults to one per CPU, 0 runs in this process')
+parser.add_argument('--daemon', '-d', metavar='ADDRESS', help='serve jobs on a Unix socket path, PORT or HOST:PORT (see pdf/_daemon.py)')
+parser.add_argument('--preload', help='with --daemon, a JSONL manifest of jobs whose templates to compile at startup')
+parser.add_argument('--queue', type=int, default=64, help='with --daemon, jobs queued or running before more are turned away')
+parser.add_argument('--profile', '-p', action='store_true', help='print time per phase, counters and parser pattern hits to stderr')
 
-pdf = Pdf().load(args.pdf)
+def main(args):
+    if args.daemon:
+        preloads = _batch.jobs_from_manifest(args.preload) if args.preload else []
+        _daemon.serve(args.daemon, preloads, workers=args.workers, max_queue=args.queue, cache=args.cache)
+        return
+    if not args.pdf: parser.error('a PDF is required')
+    if args.batch:
+        if args.pdf.endswith('.jsonl'):
+            jobs = _batch.jobs_from_manifest(args.pdf)
+        else:
+            jobs = _batch.jobs_from_glob(
+                args.pdf,
+                args.save,
+                templatify=args.templatify_forms,
+                whitelist=[int(i) for i in args.templatify_forms_whitelist.split()],
+                padding=args.templatify_forms_padding,
+                custom_padding=eval(args.templatify_forms_custom_padding),
+                uniquifier=args.templatify_forms_uniquifier,
+                remove_dv=args.templatify_forms_remove_dv,
+                cache=args.cache,
+            )
+        sys.exit(1 if _batch.report(_batch.run(jobs, args.workers)) else 0)
 
-if args.compare:
-    other = Pdf().load(args.compare)
-    for k, v in pdf.objects.items():
-        if k not in other.objects:
-            print('===== {} ===== missing from other'.format(k))
-        if other.objects[k] != v:
-            print((
-                '===== {} =====\n'
-                '{}\n'
-                '\n'
-                '===== other =====\n'
-                '{}'
-            ).format(k, v, other.objects[k]))
-    for k in other.objects.keys():
-        if k not in pdf.objects:
-            print('===== {} ===== missing'.format(k))
-if args.templatify_forms:
-    if args.templatify_forms_uniquifier:
-        pdf.uniquifier = args.templatify_forms_uniquifier
-    pdf.templatify_forms_padding = args.templatify_forms_padding
-    pdf.templatify_forms_custom_padding = eval(args.templatify_forms_custom_padding)
-    pdf.templatify_forms(
-        whitelist=[int(i) for i in args.templatify_forms_whitelist.split()],
-        remove_dv=args.templatify_forms_remove_dv,
-    )
-if args.save:
-    pdf.save(args.save)
+    cache = Cache(args.cache) if args.cache else None
+    stats = Stats() if args.profile else None
+    pdf = Pdf()
+    pdf.stats = stats
+    pdf.load(args.pdf, cache=cache)
+
+    if args.compare:
+        other = Pdf()
+        other.stats = stats
+        other.load(args.compare, cache=cache)
+        with _stats.phase(stats, 'compare'):
+            differences = list(_diff.diff(pdf, other))
+        if args.json:
+            print(json.dumps([i.to_json() for i in differences], indent=2))
+        else:
+            for i in differences: print(i)
+    if args.templatify_forms:
+        if args.templatify_forms_uniquifier:
+            pdf.uniquifier = args.templatify_forms_uniquifier
+        pdf.templatify_forms_padding = args.templatify_forms_padding
+        pdf.templatify_forms_custom_padding = eval(args.templatify_forms_custom_padding)
+        pdf.templatify_forms(
+            whitelist=[int(i) for i in args.templatify_forms_whitelist.split()],
+            remove_dv=args.templatify_forms_remove_dv,
+        )
+    if args.save:
+        pdf.save(args.save, incremental=args.incremental, compress=args.compress, recompress=args.recompress, optimize=args.optimize)
+    if stats:
+        print(stats, file=sys.stderr)
+
+# guarded so batch worker processes that re-import this module don't rerun it
+if __name__ == '__main__':
+    main(parser.parse_args())
@@ -0,0 +1,110 @@
+'''
+Appearance streams for templatified fields, p439 (12.7.3.3).
+
+Forms can have thousands of widgets sharing a handful of default appearance strings and fonts,
+so everything derived from those is worked out once and reused.
+
+This file makes page and section references to ISO 32000-1:2008.
+'''
+
+from . import _stats
+from ._objects import Stream
+
+import re
+
+pattern_tf = re.compile('/([^ ]+) ([^ ]+) Tf')
+
+class Appearances:
+    '''
+    Caches, for the `Pdf` `pdf`:
+    - `das`: `/DA` string -> (font name, font size), p440 (12.7.3.3)
+    - `resources`: font name -> `Ref` of a `/Resources` dictionary, p82 (7.8.3), shared by every appearance using that font
+
+    Appearances use the default font, the one named by the form's `/DA` in its `/DR`, p439 (Table 218).
+    '''
+
+    def __init__(self, pdf):
+        self.pdf = pdf
+        self.das = {}
+        self.resources = {}
+        self._default_font = None
+        self._default_font_found = False
+
+    def copy(self, pdf):
+        'Caches for `pdf`, a clone of this one\'s, see `Pdf.clone`.'
+        result = Appearances(pdf)
+        result.das = dict(self.das)
+        result.resources = dict(self.resources)
+        result._default_font = self._default_font
+        result._default_font_found = self._default_font_found
+        return result
+
+    def default_font(self):
+        if not self._default_font_found:
+            pdf = self.pdf
+            with _stats.phase(pdf.stats, 'font'):
+                fonts = pdf.descend('root', 'AcroForm', 'DR', 'Font')
+                da = pdf.descend('root', 'AcroForm', 'DA')
+                if not fonts:
+                    self._default_font = None
+                elif da:
+                    self._default_font = fonts[self.da(da)[0]]
+                else:
+                    self._default_font = next(iter(fonts.values()))
+            self._default_font_found = True
+        return self._default_font
+
+    def da(self, da):
+        'The font name and size, as strings, set by `Tf` in default appearance string `da`.'
+        result = self.das.get(da)
+        if result is None:
+            m = pattern_tf.search(da)
+            result = self.das[da] = m.groups() if m else ('none', '0')
+        return result
+
+    def resources_ref(self, font):
+        'Ref of a `/Resources` dictionary mapping font name `font` to the default font, added to the `Pdf` the first time.'
+        ref = self.resources.get(font)
+        if ref is None:
+            ref = self.resources[font] = self.pdf.add({
+                'Font': {
+                    font: self.default_font(),
+                }
+            })
+        return ref
+
+    def generate(self, ref, value, padding, da=None):
+        'Replace the appearances of the widget at `ref` with ones showing `value` followed by `padding` spaces.'
+        pdf = self.pdf
+        form = pdf.object(ref)
+        if 'AP' not in form: return
+        da = pdf.descend(form, 'DA') or da
+        if da:
+            font, font_size = self.da(da)
+        else:
+            font, font_size = 'none', '0'
+        rect = pdf.descend(form, 'Rect')
+        tm_f = rect[3] - rect[1]  # p88
+        stream = (
+            '/Tx BMC\n'  # p435
+            'q\n'
+            'BT\n'
+            f'{da}\n'
+            f'1 0 0 1 0 {tm_f} Tm\n'  # p250
+            f'{font_size} TL\n'
+            'T*\n'
+            f'({value})' + ' '*padding + 'Tj\n'  # p81 (7.8.2), p251 (9.4.3)
+            'ET\n'
+            'Q\n'
+            'EMC\n'
+        ).encode('utf-8')
+        resources = None
+        for k, v in pdf.descend(form, 'AP').items():  # p80 (7.7.4)
+            v = pdf.descend(v)
+            if v.__class__ != Stream: continue
+            if 'Filter' in v:
+                del v['Filter']
+            if resources is None: resources = self.resources_ref(font)
+            v['Resources'] = resources
+            v.stream = stream
+            v['Length'] = len(stream)
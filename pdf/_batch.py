@@ -0,0 +1,141 @@
+'''
+Templatifying and filling many PDFs across worker processes.
+
+A job is a `dict`, as read from a line of a JSONL manifest:
+
+- `pdf`: input file name, required
+- `save`: output file name
+- `templatify`: whether to run `Pdf.templatify_forms`, implied by `values`
+- `whitelist`: list of field object numbers, see `Pdf.templatify_forms`
+- `padding`: `Pdf.templatify_forms_padding`
+- `custom_padding`: `Pdf.templatify_forms_custom_padding`, keys can be strings since JSON requires them
+- `uniquifier`: `Pdf.uniquifier`
+- `remove_dv`: see `Pdf.templatify_forms`
+- `values`: fill the templatified PDF with these, see `CompiledTemplate.fill`, keys can be strings
+- `cache`: directory of a `Cache` to load through
+'''
+
+from ._cache import Cache
+from ._pdf import Pdf
+from ._template import CompiledTemplate
+
+import concurrent.futures
+import functools
+import glob
+import io
+import json
+import os
+import time
+
+def jobs_from_manifest(file_name):
+    with open(file_name) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def jobs_from_glob(pattern, save_dir=None, **options):
+    'One job per file matching `pattern`, saved under `save_dir` with the same base name, if given, which is created if need be.'
+    if save_dir: os.makedirs(save_dir, exist_ok=True)
+    jobs = []
+    for file_name in sorted(glob.glob(pattern)):
+        job = dict(options, pdf=file_name)
+        if save_dir: job['save'] = os.path.join(save_dir, os.path.basename(file_name))
+        jobs.append(job)
+    return jobs
+
+def templatify(pdf, whitelist=None, padding=80, custom_padding=None, uniquifier=None, remove_dv=False):
+    if uniquifier: pdf.uniquifier = uniquifier
+    pdf.templatify_forms_padding = padding
+    pdf.templatify_forms_custom_padding = {int(k): v for k, v in (custom_padding or {}).items()}
+    pdf.templatify_forms(whitelist=whitelist, remove_dv=remove_dv)
+    return pdf
+
+@functools.lru_cache(maxsize=None)
+def cache(directory):
+    'One `Cache` per directory per worker process.'
+    return Cache(directory)
+
+def load(file_name, cache_directory=None):
+    return Pdf().load(file_name, cache=cache(cache_directory) if cache_directory else None)
+
+@functools.lru_cache(maxsize=16)
+def compiled_template(file_name, mtime, whitelist, padding, custom_padding, uniquifier, remove_dv, cache_directory=None):
+    '''
+    Load, templatify and compile `file_name`, cached per worker process so repeated jobs on the same form skip the parse.
+    `mtime` is only part of the cache key, so a changed file is reloaded. Arguments are hashable versions of the job options.
+    '''
+    pdf = templatify(
+        load(file_name, cache_directory),
+        whitelist=list(whitelist),
+        padding=padding,
+        custom_padding=dict(custom_padding),
+        uniquifier=uniquifier,
+        remove_dv=remove_dv,
+    )
+    return CompiledTemplate(pdf)
+
+def job_template(job):
+    'The `CompiledTemplate` for a job that templatifies, from the per-process cache.'
+    return compiled_template(
+        job['pdf'],
+        os.path.getmtime(job['pdf']),
+        tuple(job.get('whitelist') or []),
+        job.get('padding', 80),
+        tuple(sorted((int(k), v) for k, v in (job.get('custom_padding') or {}).items())),
+        job.get('uniquifier'),
+        job.get('remove_dv', False),
+        job.get('cache'),
+    )
+
+def job_output(job):
+    'The bytes of the PDF a job makes, without saving it.'
+    if job.get('templatify') or 'values' in job:
+        template = job_template(job)
+        if 'values' in job:
+            return template.fill({int(k): v for k, v in job['values'].items()})
+        return template.template
+    file = io.BytesIO()
+    load(job['pdf'], job.get('cache')).write(file)
+    return file.getvalue()
+
+def run_job(job):
+    'Run one job. Returns a `dict` with `pdf`, `save`, `seconds` and, if the job failed, `error`.'
+    start = time.perf_counter()
+    result = {'pdf': job.get('pdf'), 'save': job.get('save')}
+    try:
+        output = job_output(job)
+        if job.get('save'):
+            with open(job['save'], 'wb') as file: file.write(output)
+    except Exception as e:
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def run(jobs, workers=None):
+    '''
+    Run `jobs` across `workers` processes (default: one per CPU), yielding results as jobs finish.
+    With `workers=0`, jobs run in this process, which is handy for profiling.
+    '''
+    if workers == 0:
+        for job in jobs: yield run_job(job)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_job, job) for job in jobs]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+def report(results):
+    'Print each result as it arrives, then a summary. Returns the number of failed jobs.'
+    start = time.perf_counter()
+    count = 0
+    failures = 0
+    busy = 0
+    for result in results:
+        count += 1
+        busy += result['seconds']
+        if 'error' in result:
+            failures += 1
+            print('{:8.3f} s FAILED {}: {}'.format(result['seconds'], result['pdf'], result['error']))
+        else:
+            print('{:8.3f} s {}{}'.format(result['seconds'], result['pdf'], ' -> {}'.format(result['save']) if result['save'] else ''))
+    elapsed = time.perf_counter() - start
+    print('{} jobs, {} failed, {:.3f} s elapsed, {:.3f} s in jobs'.format(count, failures, elapsed, busy))
+    return failures
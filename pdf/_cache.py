@@ -0,0 +1,115 @@
+'''
+Caching parsed PDFs, keyed by a hash of their content.
+
+Blank forms get loaded over and over; unpickling a parse is much faster than redoing it.
+'''
+
+from ._appearance import Appearances
+from ._pdf import Pdf, Objects
+
+import collections
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+
+# Bump when parsing or the object model changes, so entries from older versions are ignored.
+version = 4
+
+class Cache:
+    '''
+    An in-process LRU of pickled parses, limited to `max_bytes`, in front of an optional on-disk cache in `directory`.
+
+    Entries are kept pickled so every load gets its own `Pdf` to mutate.
+    `hits`, `disk_hits`, `misses` and `evictions` count what happened to loads so far.
+    '''
+
+    def __init__(self, directory=None, max_bytes=256 << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        if directory: os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return 'Cache({})'.format(self.stats())
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def load(self, file_name, pdf=None):
+        'Like `Pdf().load(file_name)`, filling `pdf` if given.'
+        if pdf is None: pdf = Pdf()
+        with open(file_name, 'rb') as f: content = f.read()
+        key = '{}-{}'.format(version, hashlib.blake2b(content, digest_size=20).hexdigest())
+        with self.lock:
+            pickled = self.entries.get(key)
+            if pickled is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        if pickled is None:
+            pickled = self._load_disk(key)
+            if pickled is None:
+                with self.lock: self.misses += 1
+                pdf._load(content, file_name)
+                pickled = pickle.dumps(
+                    (pdf.header, dict(pdf.objects), pdf.xref, pdf.trailer),
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+                self._save_disk(key, pickled)
+                self._insert(key, pickled)
+                return pdf
+            with self.lock: self.disk_hits += 1
+            self._insert(key, pickled)
+        pdf.header, objects, pdf.xref, pdf.trailer = pickle.loads(pickled)
+        pdf.appearances = Appearances(pdf)
+        pdf.objects = Objects(objects)
+        pdf._clean()
+        pdf.file_name = file_name
+        pdf.file_size = len(content)
+        return pdf
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _insert(self, key, pickled):
+        with self.lock:
+            if key in self.entries: return
+            self.entries[key] = pickled
+            self.size += len(pickled)
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def _load_disk(self, key):
+        if not self.directory: return
+        try:
+            with open(self._path(key), 'rb') as f: return f.read()
+        except FileNotFoundError:
+            return
+
+    def _save_disk(self, key, pickled):
+        if not self.directory: return
+        # write then rename, so concurrent readers never see a partial entry
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f: f.write(pickled)
+        os.replace(temp, self._path(key))
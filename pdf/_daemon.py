@@ -0,0 +1,179 @@
+'''
+A resident service for fill and templatify jobs, so each job doesn't pay for starting Python and parsing its form.
+
+Run with `python -m pdf --daemon ADDRESS`, where `ADDRESS` is a Unix socket path, or `PORT` or `HOST:PORT` for TCP.
+
+Requests and responses are framed the same way on each connection, one at a time:
+a line of JSON, then for responses, `length` bytes of PDF.
+
+A request is a job as in `pdf/_batch.py` (`pdf`, `values`, `templatify`, `whitelist`, `padding`, `custom_padding`, `uniquifier`, `remove_dv`),
+whose `save` is ignored since the PDF is sent back,
+or `{"op": "stats"}`.
+Jobs can't name a `cache`, since loading one unpickles whatever is in it; the daemon's `--cache` is used instead.
+A Unix socket is only accessible by the user running the daemon.
+
+A response has `length`, `seconds` (from when the request was read to when the PDF was ready), and `error` if the job failed.
+If `max_queue` jobs are already queued or running, a job is turned away at once with `error` `busy`.
+
+Templates given with `--preload` (a JSONL manifest of jobs) are compiled by each worker when it starts,
+so the first job on them is as fast as the rest.
+'''
+
+from . import _batch
+
+import asyncio
+import collections
+import concurrent.futures
+import json
+import os
+import socket
+import time
+
+def preload(jobs):
+    'Compile the template of each job that templatifies, into this process\'s cache.'
+    for job in jobs:
+        if job.get('templatify') or 'values' in job:
+            _batch.job_template(job)
+
+def run_job(job):
+    'Returns the PDF, or an error message. Runs in a worker.'
+    try:
+        return bytes(_batch.job_output(job)), None
+    except Exception as e:
+        return None, '{}: {}'.format(type(e).__name__, e)
+
+def percentiles(values, ps=(50, 90, 99)):
+    'Nearest-rank percentiles of `values`.'
+    values = sorted(values)
+    if not values: return {'p{}'.format(p): None for p in ps}
+    return {'p{}'.format(p): values[min(len(values) - 1, len(values) * p // 100)] for p in ps}
+
+def parse_address(address):
+    '(host, port) for `PORT` or `HOST:PORT`, otherwise the Unix socket path `address`.'
+    host, _, port = str(address).rpartition(':')
+    if port.isdigit(): return (host or 'localhost', int(port))
+    return address
+
+class Daemon:
+    '''
+    Runs jobs on `workers` processes (default: one per CPU, 0 runs them on a thread in this process),
+    admitting at most `max_queue` at a time.
+    Latencies of the last `window` jobs are kept for percentiles.
+    '''
+
+    def __init__(self, preloads=(), workers=None, max_queue=64, window=10000, cache=None):
+        self.cache = cache
+        # jobs are keyed by their cache too, so preloads use the daemon's
+        self.preloads = [dict(i, cache=cache) for i in preloads]
+        self.workers = workers
+        self.max_queue = max_queue
+        self.latencies = collections.deque(maxlen=window)
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.started = time.time()
+        self.executor = None
+
+    def stats(self):
+        return {
+            'uptime': time.time() - self.started,
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'pending': self.pending,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'latency': percentiles(self.latencies),
+        }
+
+    async def start(self):
+        if self.workers == 0:
+            self.executor = concurrent.futures.ThreadPoolExecutor(1, initializer=preload, initargs=(self.preloads,))
+        else:
+            self.executor = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=preload, initargs=(self.preloads,))
+        # start the workers now, so they preload before the first job arrives
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(self.executor, os.getpid)
+            for _ in range(self.workers if self.workers is not None else os.cpu_count() or 1)
+        ])
+
+    async def run(self, job):
+        'Returns a response header and body for `job`.'
+        start = time.perf_counter()
+        if job.__class__ != dict: raise ValueError('expected an object')
+        if 'cache' in job: raise ValueError('cache is set by the daemon')
+        if job.get('op') == 'stats':
+            return self.stats(), b''
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            return {'error': 'busy'}, b''
+        self.pending += 1
+        try:
+            job = dict(job, cache=self.cache)
+            job.pop('save', None)
+            output, error = await asyncio.get_running_loop().run_in_executor(self.executor, run_job, job)
+        finally:
+            self.pending -= 1
+        seconds = time.perf_counter() - start
+        self.latencies.append(seconds)
+        if error:
+            self.failed += 1
+            return {'error': error, 'seconds': seconds}, b''
+        self.completed += 1
+        return {'seconds': seconds}, output
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line: break
+                try:
+                    job = json.loads(line)
+                    header, body = await self.run(job)
+                except ValueError as e:
+                    header, body = {'error': 'bad request: {}'.format(e)}, b''
+                header['length'] = len(body)
+                writer.write(json.dumps(header).encode() + b'\n')
+                writer.write(body)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self, address):
+        await self.start()
+        address = parse_address(address)
+        if type(address) == tuple:
+            server = await asyncio.start_server(self.handle, *address)
+        else:
+            if os.path.exists(address): os.remove(address)
+            # created without group or other permissions, rather than changed after, so there's no window
+            umask = os.umask(0o177)
+            try:
+                server = await asyncio.start_unix_server(self.handle, address)
+            finally:
+                os.umask(umask)
+        print('serving on {}'.format(address))
+        try:
+            async with server: await server.serve_forever()
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+
+def serve(address, preloads=(), workers=None, max_queue=64, cache=None):
+    asyncio.run(Daemon(preloads, workers, max_queue, cache=cache).serve_forever(address))
+
+def request(address, job):
+    'Send `job` to the daemon at `address` and return the response header and body. A blocking client, for scripts and tests.'
+    address = parse_address(address)
+    if type(address) == tuple:
+        connection = socket.create_connection(address)
+    else:
+        connection = socket.socket(socket.AF_UNIX)
+        connection.connect(address)
+    with connection, connection.makefile('rb') as file:
+        connection.sendall(json.dumps(job).encode() + b'\n')
+        header = json.loads(file.readline())
+        return header, file.read(header['length'])
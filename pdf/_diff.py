@@ -0,0 +1,105 @@
+'''
+Structural diffs between two `Pdf`s, object by object.
+
+Identical subtrees are skipped with `==`, which is done in C for `dict` and `list`, and cheap for `Name` since names are interned.
+Hashing subtrees Merkle-style in Python would be an order of magnitude slower.
+'''
+
+from ._objects import Stream
+from ._to_bytes import Custom, to_bytes
+
+_containers = {dict, list, Stream, Custom}
+
+class Difference:
+    '''
+    One difference at `path` within the object at `ref`.
+
+    `kind` is `'changed'`, `'added'` (only in the new PDF) or `'removed'` (only in the old one).
+    `path` is like `/AP/N/Length`, with `[i]` for array elements, or `stream` for stream data.
+    `old` and `new` are the values, or `None` if there isn't one.
+    '''
+
+    def __init__(self, ref, path, kind, old=None, new=None):
+        self.ref = ref
+        self.path = path
+        self.kind = kind
+        self.old = old
+        self.new = new
+
+    def __repr__(self):
+        location = '{} {}'.format(self.ref, self.path) if self.path else str(self.ref)
+        if self.kind == 'changed':
+            return '{}: {} -> {}'.format(location, _render(self.old, 80), _render(self.new, 80))
+        return '{}: {} {}'.format(location, self.kind, _render(self.new if self.kind == 'added' else self.old, 80))
+
+    def to_json(self):
+        return {
+            'ref': repr(self.ref),
+            'path': self.path,
+            'kind': self.kind,
+            'old': None if self.kind == 'added' else _render(self.old),
+            'new': None if self.kind == 'removed' else _render(self.new),
+        }
+
+def _render(x, limit=None):
+    'PDF syntax for `x`, with stream data summarized, and cut to `limit` characters if given.'
+    if x.__class__ == Stream:
+        result = '{} stream({} bytes)'.format(_render(x.dictionary), len(x.stream))
+    elif x.__class__ == bytes:
+        result = '({} bytes)'.format(len(x))
+    else:
+        result = to_bytes(x).decode('latin-1')
+    if limit and len(result) > limit: result = result[:limit - 3] + '...'
+    return result
+
+def diff(old, new):
+    '''
+    Yield a `Difference` for each place `Pdf`s `old` and `new` differ, in `old`'s object order, then objects only in `new`.
+    Values are compared structurally, so `dict` key order and how objects are stored in the file don't matter.
+    '''
+    for k in old.objects:
+        if k not in new.objects:
+            yield Difference(k, '', 'removed', old.objects[k])
+            continue
+        yield from _diff(k, '', old.objects[k], new.objects[k])
+    for k in new.objects:
+        if k not in old.objects:
+            yield Difference(k, '', 'added', new=new.objects[k])
+
+def _diff(ref, path, a, b):
+    cls = a.__class__
+    if cls != b.__class__:
+        yield Difference(ref, path, 'changed', a, b)
+        return
+    if cls not in _containers:
+        if a != b: yield Difference(ref, path, 'changed', a, b)
+        return
+    if cls != Custom and a == b: return
+    if cls == dict:
+        for k, v in a.items():
+            p = '{}/{}'.format(path, k)
+            if k not in b:
+                yield Difference(ref, p, 'removed', v)
+            else:
+                yield from _diff(ref, p, v, b[k])
+        for k, v in b.items():
+            if k not in a:
+                yield Difference(ref, '{}/{}'.format(path, k), 'added', new=v)
+    elif cls == list:
+        for i in range(max(len(a), len(b))):
+            p = '{}[{}]'.format(path, i)
+            if i >= len(b):
+                yield Difference(ref, p, 'removed', a[i])
+            elif i >= len(a):
+                yield Difference(ref, p, 'added', new=b[i])
+            else:
+                yield from _diff(ref, p, a[i], b[i])
+    elif cls == Stream:
+        yield from _diff(ref, path, a.dictionary, b.dictionary)
+        if bytes(a.stream) != bytes(b.stream):
+            yield Difference(ref, (path + ' stream').lstrip(), 'changed', bytes(a.stream), bytes(b.stream))
+    elif cls == Custom:
+        if a.padding != b.padding:
+            yield Difference(ref, path, 'changed', a, b)
+        else:
+            yield from _diff(ref, path, a.object, b.object)
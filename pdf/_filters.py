@@ -0,0 +1,198 @@
+'''
+Stream filters, p22 (7.4), and the predictors of `/DecodeParms`, p27 (7.4.4.4).
+
+Filters are keyed by name, without the slash, and take the data and that filter's decode parameters as a `dict`.
+Predictors are undone a column or a row at a time with `bytes` slicing and `itertools.accumulate`, which run in C,
+so only the rare Average and Paeth rows cost a Python loop per byte.
+
+This file makes page and section references to ISO 32000-1:2008.
+'''
+
+from . import _stats
+
+import array
+import base64
+import itertools
+import re
+import sys
+import zlib
+
+def decode(data, filters, parms):
+    '''
+    Apply `filters`, a list of names, in order to `data`, with `parms`, a list of `dict`s or `None`s, one per filter.
+    Returns `None` if a filter isn't supported, such as the image codecs.
+    '''
+    for name, p in zip(filters, parms):
+        f = decoders.get(name)
+        if f is None: return None
+        data = f(data, p or {})
+    return data
+
+def has_predictor(parms):
+    return (parms or {}).get('Predictor', 1) > 1
+
+#===== filters =====#
+def flate(data, parms):  # p25 (7.4.4)
+    result = zlib.decompress(data)
+    if _stats.current: _stats.current.count('bytes decompressed', len(result))
+    return predicted(result, parms)
+
+def lzw(data, parms):  # p25 (7.4.4)
+    early_change = parms.get('EarlyChange', 1)
+    table = [bytes([i]) for i in range(256)] + [b'', b'']
+    result = bytearray()
+    width = 9
+    buffer = 0
+    buffered = 0
+    previous = None
+    for byte in data:
+        buffer = buffer << 8 | byte
+        buffered += 8
+        while buffered >= width:
+            buffered -= width
+            code = buffer >> buffered
+            buffer &= (1 << buffered) - 1
+            if code == 256:  # clear table
+                del table[258:]
+                width = 9
+                previous = None
+                continue
+            if code == 257:  # end of data
+                return predicted(bytes(result), parms)
+            if previous is None:
+                entry = table[code]
+            else:
+                entry = table[code] if code < len(table) else previous + previous[:1]
+                table.append(previous + entry[:1])
+            result += entry
+            previous = entry
+            if len(table) + early_change >= 1 << width and width < 12: width += 1
+    return predicted(bytes(result), parms)
+
+def ascii_hex(data, parms):  # p23 (7.4.2)
+    data = bytes(data).split(b'>')[0]
+    data = re.sub(rb'\s+', b'', data)
+    if len(data) % 2: data += b'0'
+    return bytes.fromhex(data.decode('ascii'))
+
+def ascii85(data, parms):  # p23 (7.4.3)
+    data = bytes(data).strip()
+    if data.startswith(b'<~'): data = data[2:]
+    data = data.split(b'~>')[0]
+    return base64.a85decode(data, ignorechars=b' \t\n\r\x0b\x0c\x00')
+
+def run_length(data, parms):  # p31 (7.4.5)
+    data = bytes(data)
+    result = bytearray()
+    i = 0
+    while i < len(data):
+        length = data[i]
+        if length < 128:
+            result += data[i + 1:i + 2 + length]
+            i += 2 + length
+        elif length > 128:
+            result += data[i + 1:i + 2] * (257 - length)
+            i += 2
+        else:
+            break
+    return bytes(result)
+
+decoders = {
+    'FlateDecode': flate,
+    'LZWDecode': lzw,
+    'ASCIIHexDecode': ascii_hex,
+    'ASCII85Decode': ascii85,
+    'RunLengthDecode': run_length,
+}
+
+# abbreviations used by inline images, p224 (Table 94)
+for k, v in {'Fl': 'FlateDecode', 'LZW': 'LZWDecode', 'AHx': 'ASCIIHexDecode', 'A85': 'ASCII85Decode', 'RL': 'RunLengthDecode'}.items():
+    decoders[k] = decoders[v]
+
+#===== predictors =====#
+def predicted(data, parms):
+    'Undo the predictor in `parms`, p28 (Table 8), if any.'
+    predictor = parms.get('Predictor', 1)
+    if predictor <= 1: return data
+    colors = parms.get('Colors', 1)
+    bits = parms.get('BitsPerComponent', 8)
+    columns = parms.get('Columns', 1)
+    row_size = (colors * bits * columns + 7) // 8
+    if predictor == 2: return tiff(data, colors, bits, row_size)
+    return png(data, max(1, colors * bits // 8), row_size)
+
+# where the low byte of each item is in `array('Q').tobytes()`
+_low_byte = 0 if sys.byteorder == 'little' else 7
+
+def _running_sum(data, initial=0):
+    'Running sums of the bytes of `data`, mod 256, each including `initial`. Taking the low bytes of an `array` keeps it all in C.'
+    sums = array.array('Q', itertools.accumulate(data, initial=initial)).tobytes()
+    return sums[8 + _low_byte::8]
+
+def tiff(data, colors, bits, row_size):
+    'TIFF Predictor 2, horizontal differencing, p28 (Table 8). Only 8 bits per component is supported.'
+    if bits != 8: raise Exception('unsupported TIFF predictor bits per component {}'.format(bits))
+    result = bytearray(data[:len(data) - len(data) % row_size])
+    for start in range(0, len(result), row_size):
+        for color in range(colors):
+            lane = slice(start + color, start + row_size, colors)
+            result[lane] = _running_sum(result[lane])
+    return bytes(result)
+
+def png(data, bpp, row_size):
+    '''
+    PNG predictors, p28 (Table 8), where each row starts with a byte giving its filter type.
+
+    Runs of rows with the same type are undone together.
+    For None and Up, that's a column at a time: an Up column is a running sum down the rows, mod 256.
+    Sub is a running sum along each row, a lane of `bpp` interleaved bytes at a time.
+    '''
+    stride = row_size + 1
+    rows = len(data) // stride
+    data = bytes(data[:rows * stride])
+    result = bytearray(rows * row_size)
+    prior = bytes(row_size)
+    for m in re.finditer(rb'(.)\1*', data[0::stride], re.S):
+        kind = m.group(1)[0]
+        first, last = m.start(), m.end()
+        segment = data[first * stride:last * stride]
+        out = memoryview(result)[first * row_size:last * row_size]
+        if kind in [0, 2]:
+            for column in range(row_size):
+                raw = segment[column + 1::stride]
+                if kind == 2: raw = _running_sum(raw, prior[column])
+                out[column::row_size] = raw
+        else:
+            for row in range(last - first):
+                start = row * row_size
+                raw = segment[row * stride + 1:(row + 1) * stride]
+                out[start:start + row_size] = png_row(kind, raw, prior, bpp)
+                prior = out[start:start + row_size]
+        prior = bytes(out[-row_size:])
+    return bytes(result)
+
+def png_row(kind, raw, prior, bpp):
+    'Undo a row of PNG filter type Sub, Average or Paeth.'
+    result = bytearray(raw)
+    if kind == 1:  # Sub
+        for lane in range(bpp):
+            result[lane::bpp] = _running_sum(raw[lane::bpp])
+        return result
+    if kind == 3:  # Average
+        for i in range(len(result)):
+            left = result[i - bpp] if i >= bpp else 0
+            result[i] = (result[i] + (left + prior[i]) // 2) & 255
+        return result
+    if kind == 4:  # Paeth
+        for i in range(len(result)):
+            a = result[i - bpp] if i >= bpp else 0
+            b = prior[i]
+            c = prior[i - bpp] if i >= bpp else 0
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            if pa <= pb and pa <= pc: predictor = a
+            elif pb <= pc: predictor = b
+            else: predictor = c
+            result[i] = (result[i] + predictor) & 255
+        return result
+    raise Exception('unknown PNG filter type {}'.format(kind))
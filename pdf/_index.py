@@ -0,0 +1,181 @@
+'''
+Lookups over `Pdf.objects` that would otherwise be full scans.
+
+This file makes page and section references to ISO 32000-1:2008.
+'''
+
+from ._objects import Name, Ref, Stream
+
+class Entry:
+    'What `Index` needs from one object.'
+
+    __slots__ = ('type', 'ft', 't', 'parent', 'kids')
+
+    def __init__(self, pdf, object):
+        if object.__class__ not in [dict, Stream]:
+            object = {}
+        self.type = pdf.descend(object, 'Type', extract=Name)
+        self.ft = pdf.descend(object, 'FT', extract=Name)  # p432 (12.7.3.1)
+        self.t = pdf.descend(object, 'T')
+        self.parent = object.get('Parent')
+        self.kids = [i for i in pdf.descend(object, 'Kids') or [] if i.__class__ == Ref]
+
+def _references(object, result):
+    'Add every `Ref` in `object` to `result`, without following them.'
+    stack = [object]
+    while stack:
+        x = stack.pop()
+        if x.__class__ == Ref:
+            result.add(x)
+        elif x.__class__ == dict:
+            stack.extend(x.values())
+        elif x.__class__ == list:
+            stack.extend(x)
+        elif x.__class__ == Stream:
+            stack.extend(x.dictionary.values())
+    return result
+
+class Index:
+    '''
+    Objects by `/Type`, form fields by `/FT` and fully qualified name, the `/Parent` and `/Kids` tree, and who references what.
+
+    Each part is built the first time it's used.
+    Objects assigned to or deleted from `Pdf.objects`, or marked with `Pdf.touch`, are reindexed on the next lookup.
+    Changes made directly to a `dict` object without `Pdf.touch` aren't seen, unlike by incremental saves.
+    Replacing `Pdf.objects` rebuilds everything.
+
+    Lists of refs are in the order objects were indexed, which is `Pdf.objects` order unless objects have changed since.
+    '''
+
+    def __init__(self, pdf):
+        self.pdf = pdf
+        self.objects = None
+
+    def _reset(self):
+        self.objects = self.pdf.objects
+        self.objects.observers.append(self._changed)
+        self.stale = set()
+        self.entries = None
+        self.types = None
+        self.field_types = None
+        self.names = None
+        self.outgoing = None
+        self.incoming = None
+
+    def copy(self, pdf):
+        '''
+        An index of `pdf`, whose objects are the same as the ones indexed here, see `Pdf.clone`.
+        Lookups built so far are copied rather than rebuilt, except who references what.
+        '''
+        result = Index(pdf)
+        if self.objects is None or self.entries is None: return result
+        result._reset()
+        result.stale = set(self.stale)
+        result.entries = dict(self.entries)
+        result.types = {k: dict(v) for k, v in self.types.items()}
+        result.field_types = dict(self.field_types)
+        if self.names is not None: result.names = dict(self.names)
+        return result
+
+    def _changed(self, ref):
+        self.stale.add(ref)
+
+    def _refresh(self):
+        if self.objects is not self.pdf.objects:
+            if self.objects is not None: self.objects.observers.remove(self._changed)
+            self._reset()
+        if self.entries is None:
+            self.entries = {}
+            self.types = {}
+            self.field_types = {}
+            for k, v in self.objects.items(): self._add(k, v)
+            self.stale.clear()
+        if self.stale:
+            stale = self.stale
+            self.stale = set()
+            for k in stale:
+                old = self.entries.get(k)
+                new = Entry(self.pdf, self.objects[k]) if k in self.objects else None
+                if old and new and (old.type, old.ft) == (new.type, new.ft):
+                    self.entries[k] = new
+                else:
+                    if old: self._remove(k)
+                    if new: self._add(k, new)
+                if self.names is not None and (old and old.t, old and old.parent) != (new and new.t, new and new.parent):
+                    self.names = None
+                if self.outgoing is not None:
+                    for i in self.outgoing.pop(k, ()): self.incoming[i].discard(k)
+                    if new: self._add_references(k)
+
+    def _add(self, ref, entry):
+        if entry.__class__ != Entry: entry = Entry(self.pdf, entry)
+        self.entries[ref] = entry
+        if entry.type: self.types.setdefault(entry.type, {})[ref] = None
+        if entry.ft: self.field_types[ref] = entry.ft
+
+    def _remove(self, ref):
+        entry = self.entries.pop(ref)
+        if entry.type: self.types[entry.type].pop(ref)
+        if entry.ft: self.field_types.pop(ref)
+
+    def _add_references(self, ref):
+        self.outgoing[ref] = _references(self.objects[ref], set())
+        for i in self.outgoing[ref]: self.incoming.setdefault(i, set()).add(ref)
+
+    def of_type(self, type):
+        'Refs of objects whose `/Type` is the name `type`, e.g. `\'Catalog\'`.'
+        self._refresh()
+        return list(self.types.get(type, ()))
+
+    def fields(self, ft=None):
+        'Refs of objects with an `/FT` of their own, p432 (12.7.3.1), optionally only those whose `/FT` is `ft`, e.g. `\'Tx\'`.'
+        self._refresh()
+        return [k for k, v in self.field_types.items() if ft is None or v == ft]
+
+    def field_type(self, ref):
+        self._refresh()
+        return self.field_types.get(ref)
+
+    def field_name(self, ref):
+        '''
+        Fully qualified name of the field at `ref`, p434 (12.7.3.2): the partial names of it and its ancestors, joined with periods.
+        `None` if none of them have a partial name.
+        '''
+        self._refresh()
+        parts = []
+        seen = set()
+        while ref in self.entries and ref not in seen:
+            seen.add(ref)
+            entry = self.entries[ref]
+            if entry.t is not None: parts.append(entry.t)
+            ref = entry.parent
+        return '.'.join(reversed(parts)) if parts else None
+
+    def field(self, name):
+        'Ref of the field with fully qualified name `name`, or `None`.'
+        self._refresh()
+        if self.names is None:
+            self.names = {}
+            for k, v in self.entries.items():
+                if v.t is None: continue
+                self.names.setdefault(self.field_name(k), k)
+        return self.names.get(name)
+
+    def parent(self, ref):
+        self._refresh()
+        entry = self.entries.get(ref)
+        return entry and entry.parent
+
+    def kids(self, ref):
+        self._refresh()
+        entry = self.entries.get(ref)
+        return list(entry.kids) if entry else []
+
+    def referrers(self, ref):
+        'Refs of objects that contain `ref`, directly or nested.'
+        self._refresh()
+        if self.outgoing is None:
+            self.outgoing = {}
+            self.incoming = {}
+            for k in self.entries: self._add_references(k)
+        return set(self.incoming.get(Ref(ref), ()))
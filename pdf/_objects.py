@@ -4,36 +4,140 @@ This file makes page and section references to ISO 32000-1:2008.
 Objects are documented in section 7.3 of ISO 32000-1:2008.
 '''
 
+from . import _filters, _stats
+
+import concurrent.futures
 import re
 import pprint
+import sys
+import weakref
 import zlib
 
 class Name:
+    '''
+    Names are interned: equal names are the same instance, so the default identity comparison and hash are by value.
+    Interning is weak, so names made at runtime, like templatified button values, are freed with the last object using them.
+    Don't assign to `value`.
+    '''
+
+    __slots__ = ('value', '__weakref__')
+
     escape_regex = re.compile('#([0-9a-fA-F]{2})')
+    interned = weakref.WeakValueDictionary()
 
-    def __init__(self, literal):
-        self.value = Name.escape_regex.sub(lambda m: chr(int(m.group(1), 16)), literal)
+    def __new__(cls, literal):
+        return _intern_name(name_value(literal))
 
-    def __eq__(self, other):
-        if not isinstance(other, Name): return False
-        return self.value == other.value
+    def __reduce__(self):
+        # the value is already unescaped
+        return (_intern_name, (self.value,))
 
     def __repr__(self):
         return '/{}'.format(self.value)
 
     def to_json(self): return repr(self)
 
+def name_value(literal):
+    'The value of a name written as `literal`, interned, for dictionary keys, which don\'t need a `Name`.'
+    if '#' in literal:  # p17 (7.3.5)
+        literal = Name.escape_regex.sub(lambda m: chr(int(m.group(1), 16)), literal)
+    return sys.intern(literal)
+
+def _intern_name(value):
+    name = Name.interned.get(value)
+    if name is None:
+        name = object.__new__(Name)
+        name.value = value
+        name = Name.interned.setdefault(value, name)
+    return name
+
+_undecoded = object()
+
 class Stream:
+    '''
+    `decoded` is computed from `stream` the first time it's accessed, then cached.
+    Reassigning `stream` or changing the dictionary clears the cache and sets `dirty`.
+
+    When loaded from a memory-mapped file, `stream` is a read-only `memoryview` into the mapping until it's reassigned.
+    Use `bytes(stream.stream)` where a `bytes` is needed.
+    '''
+
     def __init__(self, dictionary, stream):
         self.dictionary = dictionary
         self.stream = stream
-        self.decoded = None
+        self.dirty = False
+
+    @property
+    def stream(self):
+        return self._stream
+
+    @stream.setter
+    def stream(self, stream):
+        self._stream = stream
+        self._decoded = _undecoded
+        self.dirty = True
+
+    @property
+    def decoded(self):
+        if self._decoded is _undecoded:
+            self._decoded = self._decode()
+        return self._decoded
+
+    def filters(self):
+        'Names of the filters, in the order they decode, and their decode parameters, p22 (7.4), p20 (Table 5).'
+        filters = self.dictionary.get('Filter') or []
+        parms = self.dictionary.get('DecodeParms')
+        if filters.__class__ != list:
+            filters = [filters]
+            parms = [parms]
+        elif parms.__class__ != list:
+            parms = [parms] * len(filters)
+        return [i.value for i in filters], [i if i.__class__ == dict else None for i in parms]
+
+    def _decode(self):
         if not self.dictionary.get('Filter'):
-            self.decoded = self.stream
-        elif self.dictionary['Filter'] == Name('FlateDecode'):  # p22 (7.4), p25 (7.4.4)
-            self.decoded = zlib.decompress(self.stream)
-            try: self.decoded.decode('utf-8')
-            except: pass
+            return self.stream
+        return _filters.decode(self.stream, *self.filters())
+
+    def iter_decoded(self, chunk_size=1 << 16):
+        '''
+        Yield `decoded` in chunks of at most `chunk_size` bytes without caching it.
+        Streams that are unfiltered, or only Flate without a predictor, are processed in bounded memory.
+        '''
+        filters, parms = self.filters()
+        if not filters:
+            for i in range(0, len(self.stream), chunk_size):
+                yield self.stream[i:i+chunk_size]
+        elif filters == ['FlateDecode'] and not _filters.has_predictor(parms[0]):
+            decompressor = zlib.decompressobj()
+            for i in range(0, len(self.stream), chunk_size):
+                data = self.stream[i:i+chunk_size]
+                while not decompressor.eof:
+                    chunk = decompressor.decompress(data, chunk_size)
+                    if _stats.current: _stats.current.count('bytes decompressed', len(chunk))
+                    if chunk: yield chunk
+                    data = decompressor.unconsumed_tail
+                    if not data and len(chunk) < chunk_size: break
+                if decompressor.eof: break
+            chunk = decompressor.flush()
+            if chunk: yield chunk
+        else:
+            decoded = self._decode() if self._decoded is _undecoded else self._decoded
+            if decoded is None: raise Exception('unsupported filter {}'.format(self.dictionary['Filter']))
+            for i in range(0, len(decoded), chunk_size):
+                yield decoded[i:i+chunk_size]
+
+    def __getstate__(self):
+        # the decoded cache can be recomputed, and its sentinel can't be pickled
+        state = dict(self.__dict__)
+        del state['_decoded']
+        # nor can a view into a mapping
+        if state['_stream'].__class__ == memoryview: state['_stream'] = bytes(state['_stream'])
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._decoded = _undecoded
 
     def __eq__(self, other):
         if not isinstance(other, Stream): return False
@@ -47,9 +151,13 @@ class Stream:
 
     def __setitem__(self, key, value):
         self.dictionary[key] = value
+        self._decoded = _undecoded
+        self.dirty = True
 
     def __delitem__(self, key):
         del self.dictionary[key]
+        self._decoded = _undecoded
+        self.dirty = True
 
     def __contains__(self, item):
         return item in self.dictionary
@@ -64,7 +172,38 @@ class Stream:
     def get(self, key):
         return self.dictionary.get(key)
 
+def decode_streams(streams, workers=None):
+    '''
+    Decode each of `streams` that isn't already, across `workers` threads (default: one per CPU, plus a few).
+    `zlib` releases the GIL, so Flate streams decode in parallel.
+    '''
+    streams = [i for i in streams if i._decoded is _undecoded]
+    if not streams: return
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        decoded = list(executor.map(lambda i: i._decode(), streams))
+    for stream, data in zip(streams, decoded): stream._decoded = data
+
+def flate_streams(streams, level=6, workers=None):
+    '''
+    Compress each of `streams`, which should have no `/Filter`, with `FlateDecode` at `level`, across `workers` threads.
+    A stream is left as is if compressing wouldn't make it smaller.
+    '''
+    streams = list(streams)
+    if not streams: return
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        compressed = list(executor.map(lambda i: zlib.compress(i.stream, level), streams))
+    for stream, data in zip(streams, compressed):
+        if len(data) >= len(stream.stream): continue
+        decoded = stream._decoded
+        stream['Filter'] = Name('FlateDecode')  # p22 (7.4)
+        stream.stream = data
+        stream['Length'] = len(data)
+        # same content, so keep what's already been decoded
+        stream._decoded = decoded
+
 class Ref:
+    __slots__ = ('object_number', 'generation_number')
+
     def __init__(self, *args):
         types = [type(i) for i in args]
         if types == [str]:
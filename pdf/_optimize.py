@@ -0,0 +1,111 @@
+'''
+Shrinking a `Pdf` before it's saved: dropping objects nothing refers to, and merging identical ones.
+
+This file makes page and section references to ISO 32000-1:2008.
+'''
+
+from ._index import _references
+from ._objects import Name, Ref, Stream
+from ._to_bytes import Custom, write_bytes
+
+import hashlib
+
+# objects whose identity matters even when their contents match another's,
+# e.g. a page or widget can only appear once in its tree, p76 (7.7.3.2), p434 (12.7.3.1)
+_unique_types = {Name('Page'), Name('Pages'), Name('Annot'), Name('Catalog')}
+
+def _mergeable(object):
+    if object.__class__ == Stream: object = object.dictionary
+    if object.__class__ != dict: return True
+    if object.get('Type') in _unique_types or object.get('Subtype') == Name('Widget'): return False
+    return not ('Parent' in object or 'Kids' in object or 'FT' in object)
+
+def rewrite(object, refs):
+    '''
+    Copy of `object` with each `Ref` replaced by `refs[ref]`, or `None` if it's not in `refs`,
+    since a reference to a missing object is a reference to the null object, p21 (7.3.10).
+    Stream data is shared, not copied.
+    '''
+    cls = object.__class__
+    if cls == Ref:
+        return refs.get(object)
+    if cls == dict:
+        return {k: rewrite(v, refs) for k, v in object.items()}
+    if cls == list:
+        return [rewrite(i, refs) for i in object]
+    if cls == Stream:
+        return Stream(rewrite(object.dictionary, refs), object.stream)
+    if cls == Custom:
+        return Custom(rewrite(object.object, refs), object.padding)
+    return object
+
+def reachable(pdf):
+    'Refs of objects reachable from the trailer\'s `/Root`, `/Info` and `/Encrypt`, p56 (7.5.5), in `pdf.objects` order.'
+    trailer = pdf.trailer[-1].dictionary
+    seen = set()
+    stack = [trailer[k] for k in ['Root', 'Info', 'Encrypt'] if trailer.get(k).__class__ == Ref]
+    while stack:
+        ref = stack.pop()
+        if ref in seen or ref not in pdf.objects: continue
+        seen.add(ref)
+        stack.extend(_references(pdf.objects[ref], set()))
+    return [k for k in pdf.objects if k in seen]
+
+def canonical(pdf, refs):
+    '''
+    Map each of `refs` to the first of `refs` whose object is identical once references are mapped the same way.
+    Objects are compared by a hash of their serialization, so each pass is linear in the size of the objects.
+    Passes repeat until nothing more merges, which takes as many passes as duplicates are nested,
+    e.g. a font whose descriptor refers to a font file.
+    '''
+    result = {k: k for k in refs}
+    candidates = [k for k in refs if _mergeable(pdf.objects[k])]
+    while True:
+        first = {}
+        merged = False
+        for k in candidates:
+            h = hashlib.blake2b(digest_size=20)
+            write_bytes(rewrite(pdf.objects[k], result), h.update)
+            k_first = first.setdefault(h.digest(), k)
+            if result[k] != result[k_first]:
+                result[k] = result[k_first]
+                merged = True
+        if not merged: return result
+        candidates = [k for k in candidates if result[k] == k]
+
+def optimize(pdf):
+    '''
+    Keep only objects reachable from the trailer, merge identical ones, and renumber what's left from 1 in order.
+    Returns the number of objects dropped.
+
+    Encrypted PDFs key each object's strings and streams by its object number, p58 (7.6.2),
+    so for them, objects are only dropped, not merged or renumbered.
+    '''
+    from ._pdf import Objects, Trailer, Xref, XrefTable
+    if not pdf.trailer: raise Exception('no trailer to find reachable objects from')
+    trailer = pdf.trailer[-1].dictionary
+    refs = reachable(pdf)
+    if 'Encrypt' in trailer:
+        numbers = {k: k for k in refs}
+        kept = refs
+    else:
+        merges = canonical(pdf, refs)
+        kept = [k for k in refs if merges[k] == k]
+        new = {k: Ref(i + 1, 0) for i, k in enumerate(kept)}
+        numbers = {k: new[v] for k, v in merges.items()}
+    dropped = len(pdf.objects) - len(kept)
+    objects = Objects()
+    xref = XrefTable()
+    for k in kept:
+        ref = numbers[k]
+        objects[ref] = rewrite(pdf.objects[k], numbers)
+        xref[ref.object_number] = Xref(0, ref.generation_number, 'n')
+    dictionary = rewrite(
+        {k: v for k, v in trailer.items() if k not in ['Prev', 'XRefStm']},
+        numbers,
+    )
+    dictionary['Size'] = max([0] + [i.object_number for i in objects]) + 1
+    pdf.objects = objects
+    pdf.xref = xref
+    pdf.trailer = [Trailer(dictionary, 0)]
+    return dropped
@@ -5,16 +5,22 @@ Objects are documented in section 7.3 of ISO 32000-1:2008.
 import os
 import re
 
-from ._objects import Name, Ref, Stream
+from . import _stats
+from ._objects import Name, Ref, Stream, name_value
+
+# print each token as it's parsed, read once
+debug = bool(os.environ.get('DEBUG'))
 
 def transform_number(x):
     try: return int(x)
     except Exception: pass
     return float(x)
 
+# unrolled, so runs of ordinary bytes are consumed without trying an alternative per byte
 not_raw_paren = (
+    r'[^\\()]*'
     r'(?:'
-        r'[^\\()]|\\.'
+        r'\\.[^\\()]*'
     r')*'
 )
 
@@ -30,33 +36,55 @@ pattern_string_literal = (
     r')\)'
 )
 
+# escape sequences in literal strings, p15 (7.3.4.2)
+# other escapes are kept as is
+string_literal_escapes = {
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+    'b': '\b',
+    'f': '\f',
+    '(': '(',
+    ')': ')',
+    '\\': '\\',
+}
+
+pattern_string_literal_escape = re.compile(r'\\([nrtbf()\\]|[0-7]{1,3})')
+
+def transform_string_literal_escape(m):
+    x = m.group(1)
+    return string_literal_escapes.get(x) or chr(int(x, 8))
+
+pattern_string_literal_escape_bytes = re.compile(pattern_string_literal_escape.pattern.encode())
+
+def transform_string_literal_escape_bytes(m):
+    x = m.group(1).decode()
+    if x in string_literal_escapes: return string_literal_escapes[x].encode()
+    return bytes([int(x, 8) & 0xff])
+
 def transform_string_literal(x):
+    '''
+    A `str`, or if the string isn't UTF-8 or UTF-16 text, e.g. other encodings or encrypted strings,
+    its bytes, so they're written back as they were.
+    '''
     if x[0:2] == b'\xfe\xff':
         x = x.decode('utf-16')
     else:
         try: x = x.decode()
-        except: return x
-    for k, v in {
-        r'\n': '\n',
-        r'\r': '\r',
-        r'\t': '\t',
-        r'\b': '\b',
-        r'\f': '\f',
-        r'\(': '(',
-        r'\)': ')',
-        r'\\': '\\',
-    }.items(): x = x.replace(k, v)
-    r = re.compile(r'\\([0-8]{1,3})')
-    x = r.sub(lambda m: chr(int(m.group(1), 8)), x)
-    return x
+        except UnicodeDecodeError:
+            if b'\\' not in x: return x
+            return pattern_string_literal_escape_bytes.sub(transform_string_literal_escape_bytes, x)
+    # one pass, so an escaped backslash can't start another escape
+    if '\\' not in x: return x
+    return pattern_string_literal_escape.sub(transform_string_literal_escape, x)
+
+pattern_hex_space = re.compile(r'\s+')
 
 def transform_string_hexadecimal(x):
-    result = ''
-    for i in range(0, len(x), 2):
-        o = int(x[i], 16) * 16
-        if i + 1 < len(x): o += int(x[i + 1], 16)
-        result += chr(o)
-    return result
+    # p16 (7.3.4.3): white space is ignored, and a missing final digit is 0
+    x = pattern_hex_space.sub('', x)
+    if len(x) % 2: x += '0'
+    return bytes.fromhex(x).decode('latin-1')
 
 name_sentinel = '(?=' + '|'.join([
     r'\s',
@@ -78,72 +106,127 @@ def transform_array(x, parser, _depth):
 def transform_dictionary_or_stream(x, parser, _depth):
     result = {}
     while not parser.parse('>>', allow_nonmatch=True, _depth=_depth):
-        entry = Name(parser.parse(pattern_name, _depth=_depth)[0])
-        result[entry.value] = parser.parse_object(_depth=_depth + 1)
+        key = name_value(parser.parse(pattern_name, _depth=_depth)[0])
+        result[key] = parser.parse_object(_depth=_depth + 1)
     if parser.parse('stream', allow_nonmatch=True, skip_space=False, skip_comment=False, _depth=_depth):
         parser.i += 2
         end = parser.i+result['Length']
-        result = Stream(result, parser.content[parser.i:end])
+        result = Stream(result, parser.payload(parser.i, end))
         parser._advance(end)
         parser.parse(r'\s*endstream', _depth=_depth)
     return result
 
+_compiled_patterns = {}
+
+def compile_pattern(pattern):
+    'Compile a str pattern to a bytes regex once, so repeated tokens cost a dict lookup.'
+    compiled = _compiled_patterns.get(pattern)
+    if compiled is None:
+        compiled = re.compile(pattern.encode())
+        _compiled_patterns[pattern] = compiled
+    return compiled
+
 class Parser:
+    '''
+    Tokenizes `content` in place.
+
+    `content` can be any buffer the `re` module accepts (`bytes`, `mmap`).
+    Patterns are matched at `self.i` rather than against a slice of the remaining content,
+    so each token costs time proportional to the token, not to the rest of the file.
+    '''
+
     def __init__(self, content):
-        self.line = 1
         self.content = content
         self.i = 0
+        self.stats = _stats.current
+        # memory-mapped content is viewed rather than copied, see `payload`
+        self.view = None if content.__class__ == bytes else memoryview(content)
+
+    @property
+    def line(self):
+        # only needed for error messages, so count lazily instead of on every advance
+        return self.content[:self.i].count(b'\n') + 1
+
+    def payload(self, start, end):
+        '''
+        `content[start:end]`, for stream data.
+        If `content` is memory-mapped, this is a view into the mapping, so the data is neither copied nor read until used.
+        '''
+        if self.view is None: return self.content[start:end]
+        return self.view[start:end]
 
     def _advance(self, i, _depth=0):
-        advanced = self.content[self.i:i]
-        self.line += advanced.count(b'\n')
+        if debug: print('{}advanced to {}: {}'.format('\t' * _depth, i, self.content[self.i:i]))
         self.i = i
-        if os.environ.get('DEBUG'): print('{}advanced to {}: {}'.format('\t' * _depth, self.i, advanced))
 
     def check(self, pattern):
-        m = re.match(pattern.encode(), self.content[self.i:])
-        return m
+        return compile_pattern(pattern).match(self.content, self.i)
 
     def skip(self, pattern=r'\s*', _depth=0):
         self.parse(pattern, allow_nonmatch=True, skip_space=False, skip_comment=False, _depth=_depth)
 
+    def _fail(self, pattern):
+        raise Exception("parse failed on line {}, index {}; expected {}, got {}".format(
+            self.line, self.i, repr(pattern), repr(self.check('(.*?)(\n|\r|$)').group(1))
+        ))
+
+    def match(self, pattern, _depth=0):
+        'Like `parse`, but returns the raw match and skips nothing after it. For tight loops over many small tokens.'
+        m = self.check(pattern)
+        if not m or m.end() == self.i: self._fail(pattern)
+        self._advance(m.end(), _depth=_depth)
+        return m
+
     def parse(self, pattern, allow_nonmatch=False, skip_space=True, binary=False, skip_comment=True, _depth=0):
         m = self.check(pattern)
-        if not m or not len(m.group()):
+        if not m or m.end() == self.i:
             if allow_nonmatch: return
-            raise Exception("parse failed on line {}, index {}; expected {}, got {}".format(
-                self.line, self.i, repr(pattern), repr(self.check('(.*?)(\n|\r|$)').group(1))
-            ))
-        self._advance(self.i + len(m.group()), _depth=_depth)
-        if skip_comment:
-            self.skip(_depth=_depth)
-            if not self.check('%%EOF'):
-                self.skip('%[^\r\n]*', _depth=_depth)
-        if skip_space:
-            self.skip(_depth=_depth)
-        if binary:
-            decode = lambda x: x
-        else:
-            decode = lambda x: x.decode()
+            self._fail(pattern)
+        self._advance(m.end(), _depth=_depth)
+        skip = skip_patterns.get((skip_comment, skip_space))
+        if skip:
+            end = self.check(skip).end()
+            if end != self.i: self._advance(end, _depth=_depth)
         if m.groups():
-            result = [decode(i) for i in m.groups()]
-        else:
-            result = decode(m.group())
-        return result
+            if binary: return list(m.groups())
+            return [i.decode() for i in m.groups()]
+        if binary: return m.group()
+        return m.group().decode()
 
     def parse_object(self, _depth=0):
-        for pattern, transform, kwargs in [
-            (pattern_name, lambda x: Name(x[0]), {}),
-            ('\d+ \d+ R', Ref, {}),
-            (r'[+-]?(?:\d*)?\.?\d*', transform_number, {}),
-            (pattern_string_literal, lambda x: transform_string_literal(x[0]), {'binary': True}),
-            (r'<<', lambda x: transform_dictionary_or_stream(x, self, _depth), {}),
-            (r'\[', lambda x: transform_array(x, self, _depth), {}),
-            ('<(.*?)>', lambda x: transform_string_hexadecimal(x[0]), {}),
-            ('true', lambda x: True, {}),
-            ('false', lambda x: False, {}),
-            ('null', lambda x: None, {}),
-        ]:
-            obj = self.parse(pattern, allow_nonmatch=True, **kwargs, _depth=_depth)
-            if obj is not None: return transform(obj)
+        if self.i < len(self.content):
+            stats = self.stats
+            for pattern, transform, kwargs in object_dispatch.get(self.content[self.i], ()):
+                obj = self.parse(pattern, allow_nonmatch=True, **kwargs, _depth=_depth)
+                if stats is not None: stats.attempt(pattern, obj is not None)
+                if obj is not None: return transform(obj, self, _depth)
         raise Exception('unknown object at line {}, index {}'.format(self.line, self.i))
+
+# whitespace and comments to skip after a token, keyed by (skip_comment, skip_space)
+# a comment is skipped unless it's the end-of-file marker
+skip_patterns = {
+    (True, True): r'\s*(?:(?!%%EOF)%[^\r\n]*)?\s*',
+    (True, False): r'\s*(?:(?!%%EOF)%[^\r\n]*)?',
+    (False, True): r'\s*',
+}
+
+# (pattern, transform, parse kwargs, possible first bytes)
+# patterns that share a first byte are tried in the order listed
+object_patterns = [
+    (pattern_name, lambda x, parser, _depth: Name(x[0]), {}, '/'),
+    (r'\d+ \d+ R', lambda x, parser, _depth: Ref(x), {}, '0123456789'),
+    (r'[+-]?(?:\d*)?\.?\d*', lambda x, parser, _depth: transform_number(x), {}, '+-.0123456789'),
+    (pattern_string_literal, lambda x, parser, _depth: transform_string_literal(x[0]), {'binary': True}, '('),
+    (r'<<', transform_dictionary_or_stream, {}, '<'),
+    (r'\[', transform_array, {}, '['),
+    ('<([^>]*)>', lambda x, parser, _depth: transform_string_hexadecimal(x[0]), {}, '<'),
+    ('true', lambda x, parser, _depth: True, {}, 't'),
+    ('false', lambda x, parser, _depth: False, {}, 'f'),
+    ('null', lambda x, parser, _depth: None, {}, 'n'),
+]
+
+# first byte of an object -> candidate patterns, so each object costs one or two matches instead of up to ten
+object_dispatch = {}
+for pattern, transform, kwargs, first in object_patterns:
+    for i in first.encode():
+        object_dispatch.setdefault(i, []).append((pattern, transform, kwargs))
@@ -4,21 +4,39 @@ This file makes page and section references to ISO 32000-1:2008.
 Overall file structure is documented in section 7.5.
 '''
 
-from ._parser import Parser
-from ._objects import Name, Ref, Stream
-from ._to_bytes import to_bytes, Custom
+from . import _optimize, _stats
+from ._appearance import Appearances
+from ._index import Index
+from ._parser import Parser, compile_pattern
+from ._objects import Name, Ref, Stream, decode_streams, flate_streams
+from ._to_bytes import to_bytes, write_bytes, Custom
 
-import copy
+import array
+import collections.abc
+import hashlib
+import mmap
+import os
 import pprint
 import re
+import shutil
+import sys
 import uuid
+import zlib
 
 class Xref:
-    def __init__(self, offset, generation_number, keyword):
+    '''
+    For an object in an object stream (p45 (7.5.7)),
+    `stream` is the object number of the stream and `offset` is the index of the object within it.
+    '''
+
+    __slots__ = ('offset', 'generation_number', 'keyword', 'stream')
+
+    def __init__(self, offset, generation_number, keyword, stream=None):
         assert keyword in 'nf'
         self.offset = offset
         self.generation_number = generation_number
         self.keyword = keyword
+        self.stream = stream
 
     def __repr__(self):
         return '{:010} {:05} {}'.format(
@@ -27,7 +45,217 @@ class Xref:
             self.keyword,
         )
 
+# cross-reference table keywords and stream types, p40 (7.5.4), p51 (Table 18)
+_keyword_types = bytes.maketrans(b'fn', b'\x00\x01')
+_type_keywords = bytes.maketrans(b'\x00\x01', b'fn')
+_absent_as_free = bytes.maketrans(b'\xff', b'\x00')
+_free_only = bytes.maketrans(b'\x01\x02', b'\xff\xff')
+
+def _unsigned_typecode(width):
+    for i in 'BHIQ':
+        if array.array(i).itemsize >= width: return i
+    raise Exception('unsupported cross-reference field width {}'.format(width))
+
+def _unpack_column(rows, start, width, row_width, count):
+    'Field `start:start+width` of each of `count` big-endian rows, as an array, without a loop per row.'
+    typecode = _unsigned_typecode(width)
+    size = array.array(typecode).itemsize
+    packed = bytearray(size * count)
+    for i in range(width):
+        packed[size - width + i::size] = rows[start + i::row_width]
+    result = array.array(typecode)
+    result.frombytes(packed)
+    if sys.byteorder == 'little': result.byteswap()
+    return result
+
+def _pack_column(rows, start, width, row_width, column):
+    'Inverse of `_unpack_column`.'
+    column = array.array(column.typecode, column)
+    if sys.byteorder == 'little': column.byteswap()
+    packed = column.tobytes()
+    size = column.itemsize
+    for i in range(width):
+        rows[start + i::row_width] = packed[size - width + i::size]
+
+class XrefTable(collections.abc.MutableMapping):
+    '''
+    `Xref`s by object number, stored as columns indexed by object number rather than as one object per entry.
+
+    The columns follow the fields of a cross-reference stream, p51 (Table 18):
+    `types` is -1 where there's no entry, 0 for free, 1 for in use, 2 for in an object stream;
+    `fields` is the next free object number, the offset, or the object stream's object number;
+    `generations` is the generation number, or the index within the object stream.
+    `Xref`s are made on access, so modify entries by assigning them.
+
+    Object 0, the head of the free list, is never an entry.
+    '''
+
+    def __init__(self, items=()):
+        self.types = array.array('b')
+        self.fields = array.array('Q')
+        self.generations = array.array('I')
+        self.update(items)
+
+    def __repr__(self):
+        return pprint.pformat(dict(self.items()))
+
+    def _grow(self, size):
+        n = size - len(self.types)
+        if n <= 0: return
+        self.types.frombytes(b'\xff' * n)
+        self.fields.frombytes(bytes(self.fields.itemsize * n))
+        self.generations.frombytes(bytes(self.generations.itemsize * n))
+
+    def _assign(self, first, types, fields, generations):
+        'Set consecutive rows from columns, which are arrays of the same length.'
+        end = first + len(types)
+        self._grow(end)
+        self.types[first:end] = array.array('b', types)
+        self.fields[first:end] = array.array('Q', fields)
+        self.generations[first:end] = array.array('I', generations)
+
+    def __getitem__(self, object_number):
+        if 0 < object_number < len(self.types):
+            t = self.types[object_number]
+            if t == 1: return Xref(self.fields[object_number], self.generations[object_number], 'n')
+            if t == 2: return Xref(self.generations[object_number], 0, 'n', stream=self.fields[object_number])
+            if t == 0: return Xref(self.fields[object_number], self.generations[object_number], 'f')
+        raise KeyError(object_number)
+
+    def __setitem__(self, object_number, xref):
+        if object_number <= 0: raise KeyError(object_number)
+        self._grow(object_number + 1)
+        if xref.stream is not None:
+            row = (2, xref.stream, xref.offset)
+        else:
+            row = ('fn'.index(xref.keyword), xref.offset, xref.generation_number)
+        self.types[object_number], self.fields[object_number], self.generations[object_number] = row
+
+    def __delitem__(self, object_number):
+        if object_number not in self: raise KeyError(object_number)
+        self.types[object_number] = -1
+        self.fields[object_number] = 0
+        self.generations[object_number] = 0
+
+    def __contains__(self, object_number):
+        return 0 < object_number < len(self.types) and self.types[object_number] >= 0
+
+    def __iter__(self):
+        return (i for i, t in enumerate(self.types) if t >= 0 and i)
+
+    def __len__(self):
+        return len(self.types) - self.types.count(-1) - (1 if self.types and self.types[0] >= 0 else 0)
+
+    def update(self, other=(), **kwargs):
+        'Like `dict.update`, with a fast path for another `XrefTable` without gaps.'
+        if isinstance(other, XrefTable) and -1 not in other.types[1:]:
+            self._assign(1, other.types[1:], other.fields[1:], other.generations[1:])
+        else:
+            super().update(other, **kwargs)
+
+    def copy(self):
+        result = XrefTable()
+        result.types = self.types[:]
+        result.fields = self.fields[:]
+        result.generations = self.generations[:]
+        return result
+
+    def free(self):
+        'A copy with only the free entries.'
+        result = XrefTable()
+        result.types.frombytes(self.types.tobytes().translate(_free_only))
+        result.fields.extend(self.fields)
+        result.generations.extend(self.generations)
+        return result
+
+    @classmethod
+    def from_stream(cls, stream):
+        'Decode a cross-reference stream, p49 (7.5.8), a column at a time.'
+        result = cls()
+        decoded = stream.decoded
+        widths = stream['W']
+        row_width = sum(widths)
+        index = stream.get('Index') or [0, stream['Size']]
+        position = 0
+        for first, count in zip(index[0::2], index[1::2]):
+            if row_width: count = min(count, (len(decoded) - position) // row_width)
+            rows = decoded[position:position + count * row_width]
+            position += count * row_width
+            columns = []
+            start = 0
+            for width, default in zip(widths, [1, 0, 0]):
+                if width:
+                    columns.append(_unpack_column(rows, start, width, row_width, count))
+                else:
+                    columns.append(array.array('B', bytes([default]) * count))
+                start += width
+            # other types are references to the null object
+            if max(columns[0], default=0) > 2:
+                columns[0] = array.array('b', [i if i <= 2 else -1 for i in columns[0]])
+            result._assign(first, *columns)
+        return result
+
+    def to_stream(self, size):
+        '''
+        Rows for a cross-reference stream covering object numbers below `size`, and their field widths, p49 (7.5.8).
+        Object numbers without an entry are written as free.
+        '''
+        self._grow(size)
+        columns = [
+            array.array('B', self.types[:size].tobytes().translate(_absent_as_free)),
+            self.fields[:size],
+            self.generations[:size],
+        ]
+        # the head of the free list
+        columns[2][0] = 65535
+        widths = [1] + [max(1, (max(i, default=0).bit_length() + 7) // 8) for i in columns[1:]]
+        row_width = sum(widths)
+        rows = bytearray(row_width * size)
+        start = 0
+        for width, column in zip(widths, columns):
+            _pack_column(rows, start, width, row_width, column)
+            start += width
+        return bytes(rows), widths
+
+    def write_table(self, write, head=True, grouped=True):
+        '''
+        Write a cross-reference table section, p40 (7.5.4), with consecutive object numbers grouped into subsections.
+        With `head`, the section starts with object 0, the head of the free list, as a full section must.
+        Without `grouped`, each entry is its own subsection and entries end in a bare newline, which is how `Pdf.write` has always written them.
+        Entries in object streams can't be written in a table.
+        '''
+        if 2 in self.types: raise Exception("entries in object streams can't be written to a cross-reference table")
+        numbers = list(self)
+        if not grouped:
+            if head: write(b'0 1\n0000000000 65535 f\n')
+            write(''.join(map(
+                '{} 1\n{:010} {:05} {}\n'.format,
+                numbers,
+                [self.fields[i] for i in numbers],
+                [self.generations[i] for i in numbers],
+                ['fn'[self.types[i]] for i in numbers],
+            )).encode())
+            return
+        if head: numbers.insert(0, 0)
+        i = 0
+        while i < len(numbers):
+            j = i + 1
+            while j < len(numbers) and numbers[j] == numbers[j - 1] + 1: j += 1
+            first, end = numbers[i], numbers[j - 1] + 1
+            fields = self.fields[first:end]
+            generations = self.generations[first:end]
+            keywords = self.types[max(first, 1):end].tobytes().translate(_type_keywords).decode()
+            if first == 0:
+                fields[0] = 0
+                generations[0] = 65535
+                keywords = 'f' + keywords
+            write('{} {}\n'.format(first, end - first).encode())
+            write(''.join(map('{:010} {:05} {} \n'.format, fields, generations, keywords)).encode())
+            i = j
+
 class Trailer:
+    __slots__ = ('dictionary', 'startxref')
+
     def __init__(self, dictionary, startxref):
         self.dictionary = dictionary
         self.startxref = startxref
@@ -35,15 +263,248 @@ class Trailer:
     def __repr__(self):
         return '{} startxref {}'.format(self.dictionary, self.startxref)
 
+class ObjectStream:
+    '''
+    Index of an object stream's contents, p45 (7.5.7).
+    The stream is decoded and its header read once, then members are parsed by index on demand.
+    '''
+
+    def __init__(self, stream):
+        self.content = stream.decoded
+        self.first = stream['First']
+        header = [int(i) for i in self.content[:self.first].split()[:2 * stream['N']]]
+        # (object number, offset relative to first), by index
+        self.members = list(zip(header[0::2], header[1::2]))
+
+    def parse(self, index):
+        parser = Parser(self.content)
+        parser.i = self.first + self.members[index][1]
+        if parser.stats: parser.stats.count('objects parsed')
+        return parser.parse_object()
+
+def _fingerprint(object):
+    '''
+    Hash of the serialization of `object`, to tell whether it's been modified in place since.
+    Stream data isn't included, since reassigning it sets `Stream.dirty`.
+    '''
+    h = hashlib.blake2b(digest_size=16)
+    write_bytes(object.dictionary if object.__class__ == Stream else object, h.update)
+    return h.digest()
+
+class Objects(dict):
+    '''
+    The `dict` in `Pdf.objects`.
+    Records refs that have been assigned or deleted in `dirty`, so incremental saves know what to write,
+    and calls each of `observers` with them, so `Index` can reindex them.
+    `fingerprints` maps refs to `_fingerprint`s of their objects as of the last load or save, to find objects modified in place.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dirty = set()
+        self.fingerprints = {}
+        self.observers = []
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.changed(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.changed(key)
+
+    def changed(self, key):
+        self.dirty.add(key)
+        for i in self.observers: i(key)
+
+    def parsed_items(self):
+        return self.items()
+
+_unparsed = object()
+
+class LazyObjects(collections.abc.MutableMapping):
+    '''
+    Maps `Ref` to object like the `dict` in `Pdf.objects`,
+    but parses each object from `content` the first time it's accessed.
+
+    `offsets` maps `Ref` to the offset of the object in `content`, in iteration order.
+    For objects in object streams, the offset is instead a tuple of the stream's object number and the object's index within it.
+    '''
+
+    def __init__(self, content, offsets):
+        self.content = content
+        self.offsets = offsets
+        self.entries = dict.fromkeys(offsets, _unparsed)
+        self.dirty = set()
+        self.fingerprints = {}
+        self.observers = []
+        self.object_streams = {}
+        # parses happen after loading, so remember who's profiling
+        self.stats = _stats.current
+
+    def __getitem__(self, key):
+        value = self.entries[key]
+        if value is _unparsed:
+            with _stats.phase(self.stats, 'body'):
+                value = self.entries[key] = self._parse(key)
+                self.fingerprints[key] = _fingerprint(value)
+        return value
+
+    def __setitem__(self, key, value):
+        self.entries[key] = value
+        self.changed(key)
+
+    def __delitem__(self, key):
+        del self.entries[key]
+        self.changed(key)
+
+    def changed(self, key):
+        'See `Objects`.'
+        self.dirty.add(key)
+        for i in self.observers: i(key)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def parsed(self):
+        'How many objects have been parsed or assigned so far.'
+        return sum(v is not _unparsed for v in self.entries.values())
+
+    def parsed_items(self):
+        'Like `items`, but skips objects that haven\'t been parsed, which therefore can\'t have been modified.'
+        return ((k, v) for k, v in self.entries.items() if v is not _unparsed)
+
+    def _parse(self, ref):
+        offset = self.offsets[ref]
+        if type(offset) == tuple:
+            stream_number, index = offset
+            if stream_number not in self.object_streams:
+                self.object_streams[stream_number] = ObjectStream(self[Ref(stream_number)])
+            return self.object_streams[stream_number].parse(index)
+        parser = Parser(self.content)
+        parser.i = offset
+        parser.parse(r'\d+ \d+ obj')
+        if parser.stats: parser.stats.count('objects parsed')
+        try:
+            value = parser.parse_object()
+        except:
+            print('exception while parsing object {}'.format(ref))
+            raise
+        parser.parse('endobj')
+        return value
+
+def _copy(object):
+    'A copy of `object` that can be modified without affecting it. Immutable parts, including stream data, are shared.'
+    cls = object.__class__
+    if cls == dict:
+        return {k: _copy(v) for k, v in object.items()}
+    if cls == list:
+        return [_copy(i) for i in object]
+    if cls == Stream:
+        result = Stream(_copy(object.dictionary), object.stream)
+        result._decoded = object._decoded
+        result.dirty = object.dirty
+        return result
+    if cls == Custom:
+        return Custom(_copy(object.object), object.padding)
+    return object
+
+class SharedObjects(collections.abc.MutableMapping):
+    '''
+    Maps `Ref` to object like the `dict` in `Pdf.objects`, for `Pdf`s that share `base`, see `Pdf.clone`.
+
+    `base` is never modified. Instead, each object is copied into `own` the first time it's got,
+    since the caller may modify it, and assignments and deletions are kept in `own` and `deleted`.
+    Objects that are never got cost nothing.
+
+    Iterating `items` or `values` doesn't copy, so objects from there are read-only.
+    `dirty` starts with the refs that were dirty in the `Pdf` that `base` came from.
+    '''
+
+    def __init__(self, base, dirty=()):
+        self.base = base
+        self.own = {}
+        self.deleted = set()
+        self.dirty = set(dirty)
+        self.fingerprints = {}
+        self.observers = []
+
+    def __getitem__(self, key):
+        if key in self.own: return self.own[key]
+        if key in self.deleted: raise KeyError(key)
+        value = self.own[key] = _copy(self.base[key])
+        # changes made before the copy are in `dirty` already
+        self.fingerprints[key] = _fingerprint(value)
+        return value
+
+    def __setitem__(self, key, value):
+        self.own[key] = value
+        self.deleted.discard(key)
+        self.changed(key)
+
+    def __delitem__(self, key):
+        if key not in self: raise KeyError(key)
+        self.own.pop(key, None)
+        if key in self.base: self.deleted.add(key)
+        self.changed(key)
+
+    def changed(self, key):
+        'See `Objects`.'
+        self.dirty.add(key)
+        for i in self.observers: i(key)
+
+    def __contains__(self, key):
+        return key in self.own or key in self.base and key not in self.deleted
+
+    def __iter__(self):
+        for k in self.base:
+            if k not in self.deleted: yield k
+        for k in self.own:
+            if k not in self.base: yield k
+
+    def __len__(self):
+        return len(self.base) - len(self.deleted) + sum(k not in self.base for k in self.own)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def items(self):
+        own = self.own
+        return ((k, own[k] if k in own else self.base[k]) for k in self)
+
+    def values(self):
+        return (v for k, v in self.items())
+
+    def parsed_items(self):
+        'Objects that have been copied or assigned, since only those can have been modified.'
+        return self.own.items()
+
 class Pdf:
     def __init__(self):
         self.header = []
-        self.objects = {}
-        self.xref = {}
+        self.objects = Objects()
+        self.xref = XrefTable()
         self.trailer = []
         self.uniquifier = uuid.uuid4()
         self.templatify_forms_padding = 80
         self.templatify_forms_custom_padding = {}
+        self.file_name = None
+        self.file_size = None
+        self.index = Index(self)
+        self.appearances = Appearances(self)
+        # the mmap when loaded with `mapped`
+        self.mapping = None
+        # set to a `Stats` to profile
+        self.stats = None
 
     def __repr__(self):
         return (
@@ -63,131 +524,576 @@ class Pdf:
     def __getitem__(self, key):
         return self.objects(key)
 
-    def load(self, file_name):
-        with open(file_name, 'rb') as f: parser = Parser(f.read())
-        # header
-        self.header = parser.parse(r'%([^\n\r]*)', skip_comment=False)
-        x = parser.parse(r'%([^\n\r]*)', allow_nonmatch=True, binary=True, skip_comment=False)
-        if x: self.header.append(x[0])
+    def load(self, file_name, lazy=False, cache=None, mapped=False, decode=False):
+        '''
+        Parse `file_name` into this object.
+
+        With `lazy`, only the cross-reference sections and trailers are read up front,
+        and objects are parsed the first time they're accessed through `self.objects`.
+        If the cross-reference data is unusable, this falls back to parsing every object.
+
+        With `cache`, a `Cache`, a previous parse of the same content is reused if there is one.
+        A cached parse is always a full one in memory, so `cache` can't be combined with `lazy` or `mapped`.
+
+        With `mapped`, the file is memory-mapped instead of read, and stream data stays in the mapping until modified,
+        so it's only read from disk when used, and saving copies it straight from the mapping to the output.
+        The file must not be changed by anything else while this is loaded; saving over it is handled.
+
+        With `decode`, every stream is decoded up front, in parallel, see `decode_streams`.
+        '''
+        if cache:
+            if lazy or mapped: raise Exception("can't load lazily or mapped through a cache, since it holds full parses")
+            cache.load(file_name, self)
+        else:
+            with open(file_name, 'rb') as f:
+                if mapped:
+                    content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    content = f.read()
+            self.mapping = content if mapped else None
+            self._load(content, file_name, lazy)
+        if decode: self.decode_streams()
+        return self
+
+    def clone(self):
+        '''
+        A copy of this PDF that can be modified independently, e.g. to make several variants of one form.
+
+        Rather than copying the object graph, the two share it, see `SharedObjects`,
+        and each object is copied by whichever of them gets it from `objects`, the first time it does.
+        So a clone costs about as much as the objects it touches, and stream data is only copied when reassigned.
+        From then on, this PDF is copy-on-write too, so modify objects got from `objects` after cloning, not before.
+
+        Clones of a memory-mapped PDF share its mapping, so don't save over the mapped file while any of them are in use.
+        '''
+        index = self.index if self.index.objects is self.objects else None
+        objects = self.objects
+        if objects.__class__ != SharedObjects or objects.own or objects.deleted:
+            objects = self.objects = SharedObjects(objects, self._dirty_refs())
+            if index: self.index = index.copy(self)
+        result = Pdf.__new__(Pdf)
+        result.__dict__.update(self.__dict__)
+        result.header = list(self.header)
+        result.objects = SharedObjects(objects.base, objects.dirty)
+        result.xref = self.xref.copy()
+        result.trailer = [Trailer(_copy(i.dictionary), i.startxref) for i in self.trailer]
+        result.templatify_forms_custom_padding = dict(self.templatify_forms_custom_padding)
+        result.index = index.copy(result) if index else Index(result)
+        result.appearances = self.appearances.copy(result)
+        return result
+
+    def _load(self, content, file_name, lazy=False):
+        self.appearances = Appearances(self)
+        with _stats.phase(self.stats, 'load'):
+            parser = Parser(content)
+            self.file_name = file_name
+            self.file_size = len(parser.content)
+            # header
+            with _stats.phase(self.stats, 'header'):
+                self.header = parser.parse(r'%([^\n\r]*)', skip_comment=False)
+                x = parser.parse(r'%([^\n\r]*)', allow_nonmatch=True, binary=True, skip_comment=False)
+                if x: self.header.append(x[0])
+            loaded = False
+            if lazy:
+                with _stats.phase(self.stats, 'xref'): loaded = self._load_lazily(parser.content)
+            if not loaded: self._load_linearly(parser)
+            self._clean()
+        # return so we can use something like named constructor idiom
+        return self
+
+    def _load_linearly(self, parser):
+        offsets = {}
         while parser.i < len(parser.content):
             # body
-            while not parser.check('xref|startxref'):
-                ref = Ref(parser.parse(r'\d+ \d+ obj'))
-                try:
-                    self.objects[ref] = parser.parse_object()
-                except:
-                    print('exception while parsing object {}'.format(ref))
-                    raise
-                parser.parse('endobj')
+            with _stats.phase(self.stats, 'body'):
+                while not parser.check('xref|startxref'):
+                    offset = parser.i
+                    ref = Ref(parser.parse(r'\d+ \d+ obj'))
+                    offsets[offset] = ref
+                    if parser.stats: parser.stats.count('objects parsed')
+                    try:
+                        self.objects[ref] = parser.parse_object()
+                    except:
+                        print('exception while parsing object {}'.format(ref))
+                        raise
+                    parser.parse('endobj')
             # cross-reference
             if parser.parse('startxref', allow_nonmatch=True):
                 # stream p49 (7.5.8)
-                startxref = int(parser.parse(r'\d+'))
-                for k, v in self.objects.items():
-                    if isinstance(v, Stream) and v.get('Type') == Name('XRef'):
-                        xref = v
-                        break
-                i = 0
-                object_number = 0
-                while i < len(xref.decoded):
-                    x = []
-                    for j, v in enumerate(xref['W']):
-                        if v == 0:
-                            x.append([
-                                1,
-                                None,
-                                0 if x and x[0] == 1 else None
-                            ][j])
-                        else:
-                            x.append(int.from_bytes(xref.decoded[i:i+v], 'big'))
-                            i += v
-                    if x[0] == 0:
-                        if object_number != 0:
-                            self.xref[object_number] = Xref(x[1], x[2], 'f')
-                    elif x[0] == 1:
-                        self.xref[object_number] = Xref(x[1], x[2], 'n')
-                    elif x[0] == 2:
-                        raise Exception('unimplemented')
-                    object_number += 1
-                self.trailer.append(Trailer(
-                    {
-                        k: v
-                        for k, v in xref.dictionary.items()
-                        if k not in ['Type', 'Filter', 'DecodeParams', 'Length', 'W']
-                    },
-                    startxref,
-                ))
+                with _stats.phase(self.stats, 'xref'):
+                    startxref = int(parser.parse(r'\d+'))
+                    if startxref in offsets:
+                        xref = self.objects[offsets[startxref]]
+                    else:
+                        xref = next(
+                            self.objects[k]
+                            for k in self.index.of_type('XRef')
+                            if isinstance(self.objects[k], Stream)
+                        )
+                    self.xref.update(self._parse_xref_stream(xref))
+                with _stats.phase(self.stats, 'trailer'):
+                    self.trailer.append(self._xref_stream_trailer(xref, startxref))
             else:
                 # table
-                parser.parse('xref')
-                while not parser.check('trailer'):
-                    object_number_i, objects = [int(i) for i in parser.parse(r'[^\n\r]*').split()]
-                    for i in range(objects):
-                        offset, generation_number, keyword = parser.parse('(\d+) (\d+) ([fn])')
-                        if object_number_i + i == 0: continue
-                        self.xref[object_number_i + i] = Xref(int(offset), int(generation_number), keyword)
-                # trailer
-                parser.parse('trailer')
-                dictionary = parser.parse_object()
-                parser.parse('startxref')
-                startxref = int(parser.parse('\d+'))
-                self.trailer.append(Trailer(dictionary, startxref))
+                with _stats.phase(self.stats, 'xref'):
+                    xref = self._parse_xref_table(parser)
+                with _stats.phase(self.stats, 'trailer'):
+                    self.trailer.append(self._parse_trailer(parser))
+                with _stats.phase(self.stats, 'xref'):
+                    xref.update(self._hybrid_xref(parser.content, self.trailer[-1]))
+                    self.xref.update(xref)
             # end of file
             parser.parse('%%EOF\s*')
-        # font
-        fonts = self.descend('root', 'AcroForm', 'DR', 'Font')
-        da = self.descend('root', 'AcroForm', 'DA')
-        if da:
-            font_name = re.search('/(.*?) .*?Tf', da).group(1)
-            self.font = fonts[font_name]
-        else:
-            self.font = next(iter(fonts.values()))
-        # return so we can use something like named constructor idiom
-        return self
+        # objects in object streams go right after their stream
+        members = {}
+        for k, v in sorted(self.xref.items(), key=lambda i: (i[1].stream or 0, i[1].offset)):
+            if v.stream is None: continue
+            members.setdefault(Ref(v.stream), []).append((Ref(k), v.offset))
+        if not members: return
+        with _stats.phase(self.stats, 'body'):
+            objects = self.objects
+            self.objects = Objects()
+            for k, v in objects.items():
+                self.objects[k] = v
+                if k not in members: continue
+                object_stream = ObjectStream(v)
+                for ref, index in members[k]:
+                    self.objects[ref] = object_stream.parse(index)
+
+    def _load_lazily(self, content):
+        '''
+        Follow `startxref` and the `Prev` chain to read every cross-reference section (p56 (7.5.6)),
+        then index objects by offset without parsing them.
+
+        Returns whether this succeeded; on failure, state is left untouched.
+        '''
+        try:
+            m = re.search(rb'startxref\s+(\d+)\s+%%EOF\s*$', content[-1024:])
+            if not m: return False
+            # sections, newest first
+            sections = []
+            offset = int(m.group(1))
+            while offset is not None:
+                if any(offset == i[0] for i in sections): return False
+                parser = Parser(content)
+                parser.i = offset
+                if parser.check('xref'):
+                    xref = self._parse_xref_table(parser)
+                    trailer = self._parse_trailer(parser)
+                    xref.update(self._hybrid_xref(content, trailer))
+                    xref_stream = None
+                else:
+                    ref = Ref(parser.parse(r'\d+ \d+ obj'))
+                    stream = parser.parse_object()
+                    parser.parse('endobj')
+                    startxref = offset
+                    if parser.parse('startxref', allow_nonmatch=True):
+                        startxref = int(parser.parse(r'\d+'))
+                    xref = self._parse_xref_stream(stream)
+                    trailer = self._xref_stream_trailer(stream, startxref)
+                    xref_stream = (ref, stream)
+                sections.append((offset, xref, trailer, xref_stream))
+                offset = trailer.dictionary.get('Prev')
+        except Exception:
+            return False
+        xrefs = XrefTable()
+        first_offsets = {}
+        for _, xref, _, _ in reversed(sections):
+            xrefs.update(xref)
+            for k, v in xref.items():
+                if v.keyword == 'n' and v.stream is None: first_offsets.setdefault(k, v.offset)
+        # order like a linear load: by offset, with objects in object streams right after their stream
+        def order(k):
+            v = xrefs[k]
+            if v.stream is None: return (first_offsets.get(k, v.offset), -1)
+            return (first_offsets.get(v.stream, -1), v.offset)
+        # check each offset points at the object it claims to, so a broken table falls back rather than misparses
+        offsets = {}
+        pattern = compile_pattern(r'(\d+) (\d+) obj')
+        for k in sorted(xrefs, key=order):
+            v = xrefs[k]
+            if v.keyword != 'n': continue
+            if v.stream is not None:
+                if v.stream not in first_offsets: return False
+                offsets[Ref(k, 0)] = (v.stream, v.offset)
+                continue
+            m = pattern.match(content, v.offset)
+            if not m or (int(m.group(1)), int(m.group(2))) != (k, v.generation_number): return False
+            offsets[Ref(k, v.generation_number)] = v.offset
+        # sections that missed objects, e.g. a hybrid file's stream read as a classic table, would leave a PDF without a root
+        root = sections[0][2].dictionary.get('Root')
+        if root.__class__ != Ref or root not in offsets: return False
+        self.objects = LazyObjects(content, offsets)
+        for _, _, _, xref_stream in sections:
+            if xref_stream and xref_stream[0] in self.objects:
+                self.objects[xref_stream[0]] = xref_stream[1]
+        self.xref = xrefs
+        self.trailer = [i[2] for i in reversed(sections)]
+        return True
+
+    def _parse_xref_table(self, parser):
+        'p40 (7.5.4)'
+        result = XrefTable()
+        parser.parse('xref')
+        while not parser.check('trailer'):
+            first, count = [int(i) for i in parser.match(r'(\d+) (\d+)\s*').groups()]
+            # entries should be 20 bytes, but allow for sloppy whitespace, and split a subsection at once
+            chunk = parser.content[parser.i:parser.i + 24 * count]
+            tokens = chunk.split(None, 3 * count)
+            keywords = b''.join(tokens[2:3 * count:3])
+            if len(tokens) < 3 * count or len(keywords) != count or keywords.translate(None, b'fn'):
+                raise Exception('invalid cross-reference subsection at {}'.format(parser.i))
+            result._assign(
+                first,
+                keywords.translate(_keyword_types),
+                [int(i) for i in tokens[0:3 * count:3]],
+                [int(i) for i in tokens[1:3 * count:3]],
+            )
+            parser.i += len(chunk) - (len(tokens[3 * count]) if len(tokens) > 3 * count else 0)
+            parser.i = compile_pattern(r'\s*').match(parser.content, parser.i).end()
+        return result
+
+    def _hybrid_xref(self, content, trailer):
+        '''
+        In a hybrid-reference file, p53 (7.5.8.4), a classic section's objects in object streams are listed by the
+        cross-reference stream at its trailer's `/XRefStm`. Returns those entries, to merge into the section.
+        '''
+        result = XrefTable()
+        offset = trailer.dictionary.get('XRefStm')
+        if offset is None: return result
+        parser = Parser(content)
+        parser.i = offset
+        parser.parse(r'\d+ \d+ obj')
+        for k, v in self._parse_xref_stream(parser.parse_object()).items():
+            if v.stream is not None: result[k] = v
+        return result
+
+    def _parse_trailer(self, parser):
+        'p42 (7.5.5)'
+        parser.parse('trailer')
+        dictionary = parser.parse_object()
+        parser.parse('startxref')
+        startxref = int(parser.parse('\d+'))
+        return Trailer(dictionary, startxref)
+
+    def _parse_xref_stream(self, xref):
+        'p49 (7.5.8)'
+        return XrefTable.from_stream(xref)
+
+    def _xref_stream_trailer(self, xref, startxref):
+        return Trailer(
+            {
+                k: v
+                for k, v in xref.dictionary.items()
+                if k not in ['Type', 'Filter', 'DecodeParms', 'DecodeParams', 'Length', 'W', 'Index']
+            },
+            startxref,
+        )
+
+    def save(self, file_name, incremental=False, compress=False, recompress=None, optimize=False):
+        '''
+        Write this PDF to `file_name`.
+
+        With `incremental`, the loaded file is copied through untouched and only dirty objects are appended,
+        followed by a cross-reference section and a trailer pointing back at the previous one (p56 (7.5.6)).
+        If `file_name` is the loaded file, the update is appended to it in place.
+
+        With `compress`, see `write`.
+
+        With `recompress`, a zlib level, streams are compressed first, see `compress_streams`.
 
-    def save(self, file_name):
+        With `optimize`, unreachable and duplicate objects are dropped first, see `optimize`.
+        '''
+        if optimize:
+            if incremental: raise Exception("can't optimize an incremental save, since it renumbers objects")
+            self.optimize()
+        if recompress is not None: self.compress_streams(recompress)
+        with _stats.phase(self.stats, 'save'):
+            if incremental: return self._save_incremental(file_name)
+            if self.mapping and os.path.exists(file_name) and os.path.samefile(file_name, self.file_name):
+                self._unmap()
+            with open(file_name, 'wb') as file: self.write(file, compress=compress)
+
+    def optimize(self):
+        '''
+        Drop objects that aren't reachable from the trailer, merge identical objects, and renumber the rest compactly.
+        Returns the number of objects dropped. See `_optimize.optimize`.
+        '''
+        with _stats.phase(self.stats, 'optimize'):
+            dropped = _optimize.optimize(self)
+        # cached refs are stale
+        self.appearances = Appearances(self)
+        return dropped
+
+    def decode_streams(self, workers=None):
+        'Decode every stream now, across `workers` threads, rather than each the first time it\'s used.'
+        with _stats.phase(self.stats, 'decode'):
+            decode_streams([v for v in self.objects.values() if v.__class__ == Stream], workers)
+
+    def compress_streams(self, level=6, workers=None):
+        '''
+        Compress streams that have no `/Filter` with `FlateDecode` at zlib `level`, across `workers` threads.
+
+        Metadata streams are left readable, p556 (14.3.2), as are appearances templatified with this `uniquifier`,
+        since `CompiledTemplate` finds placeholders in them.
+        '''
+        uniquifier = str(self.uniquifier).encode()
+        streams = []
+        for k, v in self.objects.items():
+            if v.__class__ != Stream or 'Filter' in v: continue
+            if v.get('Type') == Name('Metadata'): continue
+            if uniquifier in bytes(v.stream): continue
+            # got again, in case it's shared with a clone
+            streams.append(self.objects[k])
+        with _stats.phase(self.stats, 'compress'):
+            flate_streams(streams, level, workers)
+
+    def _unmap(self):
+        'Read whatever is still in the mapping into memory, so the mapped file can be overwritten.'
+        objects = self.objects
+        # clones share what's under their own copies, which can be in the mapping too
+        while objects is not None:
+            # parses whatever a lazy load hasn't yet, so nothing needs the mapping after this
+            for k, v in objects.items():
+                if v.__class__ != Stream: continue
+                # not modifications, so bypass the setters
+                if v._stream.__class__ == memoryview: v._stream = bytes(v._stream)
+                # an unfiltered stream decodes to itself
+                if v._decoded.__class__ == memoryview: v._decoded = bytes(v._decoded)
+            if objects.__class__ == LazyObjects:
+                objects.content = None
+                for i in objects.object_streams.values():
+                    if i.content.__class__ == memoryview: i.content = bytes(i.content)
+            objects = getattr(objects, 'base', None)
+        self.mapping = None
+
+    def write(self, file, compress=False):
+        '''
+        Write this PDF to the binary file object `file`.
+
+        With `compress`, objects other than streams are packed into compressed object streams (p45 (7.5.7)),
+        and the cross-reference table is written as a compressed cross-reference stream (p49 (7.5.8)).
+        Encrypted PDFs key each object's strings by its object number, p58 (7.6.2), so for them, nothing is packed.
+        '''
+        if compress: return self._write_compressed(file)
         def fb(format, *args): return format.format(*args).encode('utf-8')
-        with open(file_name, 'wb') as file:
-            # header
-            for i in self.header:
-                file.write(b'%')
-                if type(i) == str: i = i.encode('utf-8')
-                file.write(i)
-                file.write(b'\n')
+        # header
+        for i in self.header:
+            file.write(b'%')
+            if type(i) == str: i = i.encode('utf-8')
+            file.write(i)
+            file.write(b'\n')
+        # body
+        object_offsets = {}
+        for k, v in self.objects.items():
+            object_offsets[k] = file.tell()
+            file.write(fb('{}', k))
+            file.write(b' obj ')
+            write_bytes(v, file.write)
+            file.write(b' endobj\n')
+        # cross-reference table, free entries are kept
+        xref = self.xref.free()
+        for k, v in self.xref.items():
+            if v.keyword == 'n':
+                xref[k] = Xref(object_offsets[Ref(k, v.generation_number)], v.generation_number, 'n')
+        startxref = file.tell()
+        file.write(b'xref\n')
+        xref.write_table(file.write, grouped=False)
+        # trailer
+        file.write(b'trailer\n')
+        dictionary = {
+            k: v
+            for k, v in self.trailer[-1].dictionary.items()
+            if k not in ['Prev', 'XRefStm']
+        }
+        file.write(to_bytes(dictionary))
+        file.write(fb('startxref {}\n', startxref))
+        file.write(b'%%EOF\n')
+
+    def _write_compressed(self, file, object_stream_size=100, level=6):
+        def fb(format, *args): return format.format(*args).encode('utf-8')
+        def write_object(ref, object):
+            file.write(fb('{}', ref))
+            file.write(b' obj ')
+            write_bytes(object, file.write)
+            file.write(b' endobj\n')
+        # header, object streams need 1.5
+        header = list(self.header)
+        if header and type(header[0]) == str:
+            m = re.match(r'PDF-(\d+)\.(\d+)$', header[0])
+            if m and (int(m.group(1)), int(m.group(2))) < (1, 5): header[0] = 'PDF-1.5'
+        for i in header:
+            file.write(b'%')
+            if type(i) == str: i = i.encode('utf-8')
+            file.write(i)
+            file.write(b'\n')
+        # body
+        trailer = self.trailer[-1].dictionary
+        encrypted = 'Encrypt' in trailer
+        xref = XrefTable()
+        packed = []
+        for k, v in self.objects.items():
+            if isinstance(v, Stream):
+                # rewritten below
+                if v.get('Type') in [Name('XRef'), Name('ObjStm')]: continue
+            elif k.generation_number == 0 and not encrypted:
+                packed.append((k, v))
+                continue
+            xref[k.object_number] = Xref(file.tell(), k.generation_number, 'n')
+            write_object(k, v)
+        object_number = max([trailer.get('Size', 0)] + [k.object_number + 1 for k in self.objects])
+        for i in range(0, len(packed), object_stream_size):
+            offsets = []
+            contents = []
+            offset = 0
+            for index, (k, v) in enumerate(packed[i:i+object_stream_size]):
+                offsets.append('{} {}'.format(k.object_number, offset))
+                contents.append(to_bytes(v))
+                offset += len(contents[-1]) + 1
+                xref[k.object_number] = Xref(index, 0, 'n', stream=object_number)
+            header = ' '.join(offsets).encode('utf-8') + b'\n'
+            stream = zlib.compress(header + b'\n'.join(contents), level)
+            xref[object_number] = Xref(file.tell(), 0, 'n')
+            write_object(Ref(object_number), Stream({
+                'Type': Name('ObjStm'),
+                'N': len(offsets),
+                'First': len(header),
+                'Filter': Name('FlateDecode'),
+                'Length': len(stream),
+            }, stream))
+            object_number += 1
+        # cross-reference stream, which lists itself
+        startxref = file.tell()
+        xref[object_number] = Xref(startxref, 0, 'n')
+        size = object_number + 1
+        rows, w = xref.to_stream(size)
+        stream = zlib.compress(rows, level)
+        dictionary = {
+            'Type': Name('XRef'),
+            'Size': size,
+            'W': w,
+            'Filter': Name('FlateDecode'),
+            'Length': len(stream),
+        }
+        for k, v in trailer.items():
+            if k in ['Prev', 'Size', 'Type', 'Filter', 'DecodeParms', 'DecodeParams', 'Length', 'W', 'Index', 'XRefStm']: continue
+            dictionary[k] = v
+        write_object(Ref(object_number), Stream(dictionary, stream))
+        file.write(fb('startxref\n{}\n', startxref))
+        file.write(b'%%EOF\n')
+
+    @property
+    def font(self):
+        'The default font of the form, see `Appearances`.'
+        return self.appearances.default_font()
+
+    @font.setter
+    def font(self, font):
+        self.appearances._default_font = font
+        self.appearances._default_font_found = True
+
+    def add(self, object):
+        '''
+        Add `object` as a new indirect object, p21 (7.3.10), and return its `Ref`.
+        Its object number is one past the highest in use, and the trailer's `/Size` grows to cover it.
+        '''
+        object_number = max([len(self.xref.types), 1] + [i.object_number + 1 for i in self.objects])
+        if self.trailer:
+            object_number = max(object_number, self.trailer[-1].dictionary.get('Size', 0))
+            self.trailer[-1].dictionary['Size'] = object_number + 1
+        ref = Ref(object_number, 0)
+        self.xref[object_number] = Xref(0, 0, 'n')
+        self.objects[ref] = object
+        return ref
+
+    def touch(self, ref):
+        '''
+        Mark the object at `ref` as modified, so `save(incremental=True)` writes it, and `Index` reindexes it.
+
+        Incremental saves also find objects modified in place by comparing `_fingerprint`s, see `Objects`,
+        but `Index` only sees assignments to `self.objects`, `Stream` changes, and `touch`.
+        '''
+        self.objects.changed(Ref(ref))
+
+    def _dirty_refs(self):
+        result = set(self.objects.dirty)
+        fingerprints = self.objects.fingerprints
+        for k, v in self.objects.parsed_items():
+            if k in result: continue
+            if isinstance(v, Stream) and v.dirty or fingerprints.get(k) != _fingerprint(v): result.add(k)
+        return result
+
+    def _clean(self, refs=None):
+        'Mark everything saved. If given, `refs` are the only objects that can differ from their fingerprints.'
+        self.objects.dirty.clear()
+        fingerprints = self.objects.fingerprints
+        for k, v in self.objects.parsed_items():
+            if isinstance(v, Stream): v.dirty = False
+            if refs is None or k in refs: fingerprints[k] = _fingerprint(v)
+
+    def _save_incremental(self, file_name):
+        def fb(format, *args): return format.format(*args).encode('utf-8')
+        if os.path.getsize(self.file_name) != self.file_size:
+            raise Exception('{} changed since it was loaded'.format(self.file_name))
+        dirty = self._dirty_refs()
+        in_place = os.path.exists(file_name) and os.path.samefile(file_name, self.file_name)
+        if in_place and not dirty: return
+        with open(self.file_name, 'rb') as source:
+            source.seek(-1, os.SEEK_END)
+            eol = source.read(1) in b'\r\n'
+            if in_place:
+                file = open(file_name, 'ab')
+            else:
+                source.seek(0)
+                file = open(file_name, 'wb')
+                shutil.copyfileobj(source, file)
+        with file:
+            if not dirty: return
+            if not eol: file.write(b'\n')
             # body
-            object_offsets = {}
-            for k, v in self.objects.items():
-                object_offsets[k] = file.tell()
+            xref = XrefTable()
+            for k in self.objects:
+                if k not in dirty: continue
+                xref[k.object_number] = Xref(file.tell(), k.generation_number, 'n')
                 file.write(fb('{}', k))
                 file.write(b' obj ')
-                file.write(to_bytes(v))
+                write_bytes(self.objects[k], file.write)
                 file.write(b' endobj\n')
-            # cross-reference table
+            for k in sorted(dirty, key=lambda i: i.object_number):
+                if k in self.objects: continue
+                xref[k.object_number] = Xref(0, k.generation_number + 1, 'f')
+            # cross-reference section
             startxref = file.tell()
             file.write(b'xref\n')
-            file.write(b'0 1\n')
-            file.write(fb('{}\n', Xref(0, 65535, 'f')))
-            for k, v in sorted(self.xref.items()):
-                file.write(fb('{} 1\n', k))
-                xref = copy.copy(v)
-                xref.offset = object_offsets[Ref(k, v.generation_number)]
-                file.write(fb('{}\n', xref))
+            xref.write_table(file.write, head=False)
             # trailer
-            file.write(b'trailer\n')
             dictionary = {
                 k: v
                 for k, v in self.trailer[-1].dictionary.items()
-                if k != Name('Prev')
+                if k not in ['Prev', 'Type', 'Filter', 'DecodeParms', 'DecodeParams', 'Length', 'W', 'Index', 'XRefStm']
             }
-            file.write(to_bytes(dictionary))
-            file.write(fb('startxref {}\n', startxref))
+            dictionary['Size'] = max([dictionary.get('Size', 0)] + [i + 1 for i in xref])
+            dictionary['Prev'] = self.trailer[-1].startxref
+            file.write(b'trailer\n')
+            write_bytes(dictionary, file.write)
+            file.write(fb('\nstartxref\n{}\n', startxref))
             file.write(b'%%EOF\n')
+        # the saved file is now what later incremental saves build on
+        for k, v in xref.items():
+            if v.keyword == 'n':
+                self.xref[k] = v
+            else:
+                self.xref.pop(k, None)
+        self.trailer.append(Trailer(dictionary, startxref))
+        self.file_name = file_name
+        self.file_size = os.path.getsize(file_name)
+        self._clean(dirty)
 
     def root(self):
         if self.trailer:
             return self.trailer[-1].dictionary['Root']
-        for k, v in self.objects.items():
-            if type(v) == dict and v.get('Type') == Name('Catalog'):
+        for k in self.index.of_type('Catalog'):
+            if type(self.objects[k]) == dict:
                 return k
 
     def object(self, *args):
@@ -218,6 +1124,7 @@ class Pdf:
         if self.remove_dv and 'DV' in form:
             del form['DV']
         form['V'] = Custom(self._template_value('t', ref), padding=self._templatify_padding(ref))
+        self.touch(ref)
         self._templatify_appearance(ref, self._template_value('g', ref), da)
 
     def templatify_button(self, ref, **kwargs):
@@ -227,25 +1134,48 @@ class Pdf:
         value = self._template_value('b', ref)
         form['AS'] = Custom(Name(value), padding=self._templatify_padding(ref))
         form['V'] = Custom(Name(value), padding=self._templatify_padding(ref))
+        self.touch(ref)
 
     def templatify_choice(self, ref, **kwargs):
         whitelist = kwargs.get('whitelist')
         form = self.object(ref)
         value = self._template_value('c', ref)
         form['V'] = Custom(value, padding=self._templatify_padding(ref))
+        self.touch(ref)
         self._templatify_appearance(ref, value)
 
     def templatify_forms(self, whitelist=None, remove_dv=False):
+        '''
+        `whitelist` is of field object numbers, or fully qualified field names, p434 (12.7.3.2).
+        If given, only those fields (and fields with kids) are templatified.
+        A name covers its field's kids too, since widgets without a partial name of their own have no name to list.
+        '''
         self.remove_dv = remove_dv
-        for k, v in self.objects.items():
-            if not self._white(k, whitelist): continue
-            ft = self.descend(v, 'FT', extract=Name)
-            if ft == 'Tx': #  p430 (12.7)
-                self.templatify_text(k, whitelist=whitelist)
-            elif ft == 'Btn':
-                self.templatify_button(k, whitelist=whitelist)
-            elif ft == 'Ch':
-                self.templatify_choice(k, whitelist=whitelist)
+        if whitelist:
+            numbers = set()
+            for i in whitelist:
+                if type(i) == int:
+                    numbers.add(i)
+                    continue
+                stack = [self.index.field(i)] if self.index.field(i) else []
+                while stack:
+                    ref = stack.pop()
+                    if ref.object_number in numbers: continue
+                    numbers.add(ref.object_number)
+                    stack.extend(self.index.kids(ref))
+            whitelist = numbers
+        else:
+            whitelist = None
+        with _stats.phase(self.stats, 'templatify'):
+            for k in self.index.fields():
+                if not self._white(k, whitelist): continue
+                ft = self.index.field_type(k)
+                if ft == 'Tx': #  p430 (12.7)
+                    self.templatify_text(k, whitelist=whitelist)
+                elif ft == 'Btn':
+                    self.templatify_button(k, whitelist=whitelist)
+                elif ft == 'Ch':
+                    self.templatify_choice(k, whitelist=whitelist)
 
     def _templatify_kids(self, ref, templatify, whitelist, da=None):
         form = self.object(ref)
@@ -257,9 +1187,9 @@ class Pdf:
         return False
 
     def _white(self, ref, whitelist):
-        if not whitelist:
+        if whitelist is None:
             return True
-        if self.descend(ref, 'Kids'):
+        if self.index.kids(ref):
             return True
         if ref.object_number in whitelist:
             return True
@@ -269,39 +1199,7 @@ class Pdf:
         return '{}{}-{}'.format(prefix, ref.object_number, self.uniquifier)
 
     def _templatify_appearance(self, ref, value, da=None):
-        form = self.object(ref)
-        if 'AP' not in form: return
-        da = self.descend(form, 'DA') or da
-        if da:
-            font, font_size = re.search('/([^ ]+) ([^ ]+) Tf', da).groups()
-        else:
-            font, font_size = 'none', '0'
-        rect = self.descend(form, 'Rect')
-        tm_f = rect[3] - rect[1]  # p88
-        for k, v in self.descend(form, 'AP').items():  # p80 (7.7.4)
-            v = self.descend(v)
-            if v.__class__ != Stream: continue
-            if 'Filter' in v:
-                del v['Filter']
-            v['Resources'] = {
-                'Font': {
-                    font: self.font,
-                }
-            }
-            v.stream = (
-                '/Tx BMC\n'  # p435
-                'q\n'
-                'BT\n'
-                f'{da}\n'
-                f'1 0 0 1 0 {tm_f} Tm\n'  # p250
-                f'{font_size} TL\n'
-                'T*\n'
-                f'({value})' + ' '*self._templatify_padding(ref) + 'Tj\n'  # p81 (7.8.2), p251 (9.4.3)
-                'ET\n'
-                'Q\n'
-                'EMC\n'
-            ).encode('utf-8')
-            v['Length'] = len(v.stream)
+        self.appearances.generate(ref, value, self._templatify_padding(ref), da)
 
     def _templatify_padding(self, ref):
         return self.templatify_forms_custom_padding.get(ref.object_number, self.templatify_forms_padding)
@@ -0,0 +1,296 @@
+'''
+An HTTP server for the viewer in `index.html`, run with `python go.py --server DIR`, then browse to it.
+
+Only PDFs under `root`, `DIR`, can be opened, named relative to it.
+The viewer is served from here too, so there are no CORS headers: other sites' pages can't read responses.
+Requests must name this server as their `Host`, so a site can't rebind its own name to it either.
+Errors are sent back as `RequestError` messages, never as what went wrong parsing a file.
+
+Each file is loaded lazily, once, and the `Pdf` is shared by every client viewing it.
+Objects are parsed as they're asked for, and stream data is sent a page at a time.
+Parsing and decoding run on the executor, so one big object doesn't hold up other clients.
+
+Endpoints take and return JSON, and are `POST`s:
+- `/open`, `{"file": ...}` -> `{"session": ..., "root": ..., "size": ...}`
+- `/objects`, `{"session": ..., "refs": ["12 0", ...], "stream_limit": ...}` -> `{"12 0": object, ...}`
+- `/stream`, `{"session": ..., "ref": ..., "offset": ..., "length": ...}` -> `{"offset": ..., "length": ..., "data": ...}`
+
+Objects are JSON like `to_json` makes them, except stream data is cut to `stream_limit` bytes.
+Streams have `pdf_py_meta` with `decoded`, the first page of data, and `length`, the length of all of it.
+Stream data is latin-1, so each character is a byte.
+
+`GET /stream/<session>/<object number>/<generation number>` sends a stream's decoded data as is, honouring a `Range: bytes=` header.
+
+Responses are gzipped for clients that accept it.
+'''
+
+from ._objects import Name, Ref, Stream
+from ._pdf import Pdf
+from ._to_bytes import Custom
+
+import asyncio
+import collections
+import gzip
+import hashlib
+import json
+import os
+import re
+
+# bytes of stream data sent with an object unless the request says otherwise
+stream_limit = 1 << 12
+
+# responses smaller than this aren't worth compressing
+gzip_min_size = 1 << 10
+
+index_html = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'index.html')
+
+class RequestError(Exception):
+    'An error whose message is safe to send to the client, with HTTP status `status`.'
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+statuses = {
+    200: 'OK',
+    206: 'Partial Content',
+    400: 'Bad Request',
+    404: 'Not Found',
+    416: 'Range Not Satisfiable',
+}
+
+def to_json(x, stream_limit=stream_limit):
+    'A JSON-able copy of object `x`, with at most `stream_limit` bytes of data for each stream.'
+    cls = x.__class__
+    if cls in [Name, Ref]:
+        return x.to_json()
+    if cls == dict:
+        return {k: to_json(v, stream_limit) for k, v in x.items()}
+    if cls == list:
+        return [to_json(i, stream_limit) for i in x]
+    if cls == Stream:
+        data, decoded = stream_data(x)
+        result = to_json(x.dictionary, stream_limit)
+        assert 'pdf_py_meta' not in result
+        result['pdf_py_meta'] = {
+            'type': 'stream',
+            'decoded': data[:stream_limit].decode('latin-1'),
+            'length': len(data),
+            'encoded': not decoded,
+        }
+        return result
+    if cls == Custom:
+        return to_json(x.object, stream_limit)
+    if cls == bytes:
+        return x.decode('latin-1')
+    return x
+
+def stream_data(stream):
+    'Decoded data of `stream`, or its encoded data if its filter is unsupported, and which it is.'
+    try:
+        decoded = stream.decoded
+    except Exception:
+        decoded = None
+    if decoded is None: return bytes(stream.stream), False
+    return decoded, True
+
+class Session:
+    'A file, and its `Pdf` once loaded.'
+
+    def __init__(self, key, file_name):
+        self.key = key
+        self.file_name = file_name
+        self.pdf = None
+        self.loading = None
+
+    async def load(self):
+        # the first caller loads, off the event loop, and everyone else waits for it
+        if self.loading is None:
+            loop = asyncio.get_running_loop()
+            self.loading = loop.run_in_executor(None, lambda: Pdf().load(self.file_name, lazy=True))
+        loading = self.loading
+        try:
+            self.pdf = await asyncio.shield(loading)
+        except Exception:
+            # so the next request tries again, rather than failing until the file changes
+            if self.loading is loading: self.loading = None
+            raise
+        return self.pdf
+
+class Server:
+    '''
+    Keeps up to `max_sessions` files loaded, dropping the least recently used.
+    A file that changes on disk gets a new session.
+    '''
+
+    def __init__(self, root='.', max_sessions=8):
+        self.root = os.path.realpath(root)
+        self.max_sessions = max_sessions
+        self.sessions = collections.OrderedDict()
+        self.hosts = set()
+
+    def session(self, key):
+        session = self.sessions.get(key)
+        if session is None: raise RequestError('unknown session {}'.format(key), 404)
+        self.sessions.move_to_end(key)
+        return session
+
+    def path(self, file_name):
+        'Absolute path of `file_name`, relative to `root`, which it has to be under, symlinks and all.'
+        path = os.path.realpath(os.path.join(self.root, file_name))
+        if os.path.commonpath([path, self.root]) != self.root or not os.path.isfile(path):
+            raise RequestError('no such file {}'.format(file_name), 404)
+        return path
+
+    async def open(self, file_name):
+        file_name = self.path(file_name)
+        stat = os.stat(file_name)
+        key = hashlib.blake2b(
+            '{} {} {}'.format(file_name, stat.st_mtime_ns, stat.st_size).encode(),
+            digest_size=8,
+        ).hexdigest()
+        session = self.sessions.get(key)
+        if session is None:
+            session = self.sessions[key] = Session(key, file_name)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        self.sessions.move_to_end(key)
+        pdf = await session.load()
+        root = pdf.root()
+        return {
+            'session': key,
+            'root': root and root.to_json(),
+            'size': pdf.file_size,
+        }
+
+    async def objects(self, key, refs, limit=stream_limit):
+        pdf = await self.session(key).load()
+        def f():
+            result = {}
+            for i in refs:
+                ref = Ref(i)
+                result[i] = to_json(pdf.objects[ref], limit) if ref in pdf.objects else None
+            return result
+        return await asyncio.get_running_loop().run_in_executor(None, f)
+
+    async def stream_data(self, key, *ref):
+        'Data of the stream at `ref` in session `key`, see `stream_data`.'
+        pdf = await self.session(key).load()
+        def f():
+            stream = pdf.object(*ref)
+            if stream.__class__ != Stream: raise RequestError('{} is not a stream'.format(Ref(*ref)))
+            return stream_data(stream)
+        return await asyncio.get_running_loop().run_in_executor(None, f)
+
+    async def stream(self, key, ref, offset=0, length=stream_limit):
+        data, decoded = await self.stream_data(key, ref)
+        page = data[offset:offset+length]
+        return {
+            'offset': offset,
+            'length': len(data),
+            'data': page.decode('latin-1'),
+            'encoded': not decoded,
+        }
+
+    #===== HTTP =====#
+    async def respond(self, method, path, headers, body):
+        'Returns (status, content type, payload, extra headers).'
+        if headers.get('host') not in self.hosts:
+            raise RequestError('unexpected host', 400)
+        if method in ['GET', 'HEAD'] and path in ['/', '/index.html']:
+            with open(index_html, 'rb') as file:
+                return 200, 'text/html; charset=utf-8', file.read(), {}
+        if method == 'POST':
+            params = json.loads(body or b'{}')
+            if path == '/open':
+                result = await self.open(params['file'])
+            elif path == '/objects':
+                result = await self.objects(params['session'], params['refs'], params.get('stream_limit', stream_limit))
+            elif path == '/stream':
+                result = await self.stream(
+                    params['session'],
+                    params['ref'],
+                    params.get('offset', 0),
+                    params.get('length', stream_limit),
+                )
+            else:
+                return 404, 'application/json', b'{"error": "not found"}', {}
+            return 200, 'application/json', json.dumps(result).encode(), {}
+        m = re.fullmatch(r'/stream/(\w+)/(\d+)/(\d+)', path)
+        if method == 'GET' and m:
+            data, _ = await self.stream_data(m.group(1), int(m.group(2)), int(m.group(3)))
+            return self.ranged(data, headers.get('range'))
+        return 404, 'application/json', b'{"error": "not found"}', {}
+
+    def ranged(self, data, header):
+        'Respond with `data`, or the part of it asked for by Range header `header`. Only single ranges are supported.'
+        size = len(data)
+        m = header and re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip())
+        if not m:
+            return 200, 'application/octet-stream', data, {'Accept-Ranges': 'bytes'}
+        start, end = m.groups()
+        if start:
+            start = int(start)
+            end = min(int(end), size - 1) if end else size - 1
+        elif end:
+            # suffix, the last `end` bytes
+            start = max(size - int(end), 0)
+            end = size - 1
+        else:
+            start, end = 0, -1
+        if start > end:
+            return 416, None, b'', {'Content-Range': 'bytes */{}'.format(size)}
+        return 206, 'application/octet-stream', data[start:end+1], {
+            'Accept-Ranges': 'bytes',
+            'Content-Range': 'bytes {}-{}/{}'.format(start, end, size),
+        }
+
+    async def handle(self, reader, writer):
+        'Serve HTTP/1.1 requests on one connection until the client closes it.'
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip(): break
+                method, target, version = line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip(): break
+                    k, _, v = line.decode('latin-1').partition(':')
+                    headers[k.strip().lower()] = v.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                try:
+                    status, content_type, payload, extra = await self.respond(method, target.split('?')[0], headers, body)
+                except RequestError as e:
+                    status, content_type, payload, extra = e.status, 'application/json', json.dumps({'error': str(e)}).encode(), {}
+                except Exception:
+                    # parse errors can quote the file, so say nothing about them
+                    status, content_type, payload, extra = 400, 'application/json', b'{"error": "bad request"}', {}
+                response = dict(extra)
+                if content_type: response['Content-Type'] = content_type
+                if len(payload) >= gzip_min_size and 'gzip' in headers.get('accept-encoding', ''):
+                    payload = gzip.compress(payload, compresslevel=6)
+                    response['Content-Encoding'] = 'gzip'
+                    response['Vary'] = 'Accept-Encoding'
+                response['Content-Length'] = str(len(payload))
+                writer.write('HTTP/1.1 {} {}\r\n{}\r\n'.format(
+                    status,
+                    statuses[status],
+                    ''.join('{}: {}\r\n'.format(k, v) for k, v in response.items()),
+                ).encode('latin-1'))
+                if method != 'HEAD': writer.write(payload)
+                await writer.drain()
+                if version == 'HTTP/1.0' or headers.get('connection', '').lower() == 'close': break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self, host='localhost', port=8000):
+        server = await asyncio.start_server(self.handle, host, port)
+        self.hosts = {'{}:{}'.format(i, port) for i in [host, 'localhost', '127.0.0.1', '[::1]']}
+        print('serving {} on http://{}:{}/'.format(self.root, host, port))
+        async with server: await server.serve_forever()
+
+def serve(root='.', host='localhost', port=8000, max_sessions=8):
+    asyncio.run(Server(root, max_sessions).serve_forever(host, port))
@@ -0,0 +1,71 @@
+'''
+Opt-in profiling: time spent per phase, and counters, collected into a `Stats`.
+
+Set `Pdf.stats` to a `Stats` to profile that `Pdf`.
+While one of its phases runs, its `Stats` is `current`, which is where parsers and streams count.
+When nothing is being profiled, `current` is `None`; a `Parser` reads it once when it's made,
+so the cost per token is one check of an attribute.
+'''
+
+import contextlib
+import time
+
+current = None
+
+class Stats:
+    '''
+    `timers`: phase -> seconds; phases nest, so e.g. `load` includes `body`
+    `counters`: name -> count, e.g. `objects parsed`, `bytes decompressed`
+    `patterns`: pattern -> [attempts, misses], for patterns tried by `Parser.parse_object`
+    '''
+
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self.patterns = {}
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def attempt(self, pattern, matched):
+        x = self.patterns.get(pattern)
+        if x is None: x = self.patterns[pattern] = [0, 0]
+        x[0] += 1
+        if not matched: x[1] += 1
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        global current
+        previous = current
+        current = self
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] = self.timers.get(name, 0) + time.perf_counter() - start
+            current = previous
+
+    def __repr__(self):
+        lines = ['===== timers =====']
+        lines.extend('{:>12.6f} s {}'.format(v, k) for k, v in self.timers.items())
+        lines.append('===== counters =====')
+        lines.extend('{:>12} {}'.format(v, k) for k, v in sorted(self.counters.items()))
+        lines.append('===== patterns =====')
+        lines.append('{:>12} {:>12} {}'.format('attempts', 'misses', 'pattern'))
+        lines.extend(
+            '{:>12} {:>12} {}'.format(v[0], v[1], k)
+            for k, v in sorted(self.patterns.items(), key=lambda i: -i[1][0])
+        )
+        return '\n'.join(lines)
+
+    def to_json(self):
+        return {
+            'timers': self.timers,
+            'counters': self.counters,
+            'patterns': {k: {'attempts': v[0], 'misses': v[1]} for k, v in self.patterns.items()},
+        }
+
+def phase(stats, name):
+    '`stats.phase(name)`, or nothing if `stats` is `None`.'
+    if stats is None: return contextlib.nullcontext()
+    return stats.phase(name)
@@ -0,0 +1,124 @@
+'''
+Filling templatified PDFs without parsing.
+
+`Pdf.templatify_forms` replaces field values and appearances with placeholders padded to a fixed width.
+Since every placeholder occupies a fixed number of bytes, a value that fits in that width can be written over the placeholder without moving anything else in the file, so the cross-reference table stays valid.
+'''
+
+from ._objects import Ref
+from ._to_bytes import transform_string
+
+import functools
+import io
+import itertools
+import operator
+import re
+
+@functools.lru_cache(maxsize=1 << 12)
+def render(kind, value):
+    '''
+    Serialize `value` for a slot of `kind`, as `to_bytes` would, but without its stack machine or interning a `Name`.
+    Cached since the same values (Off, Yes, blank) come up in fill after fill.
+    '''
+    if kind == 'b':
+        return b'/' + (value or 'Off').encode('utf-8')
+    value = value or ''
+    # most values need no escaping, so skip straight to the result
+    if value.isascii() and value.isprintable() and not ('(' in value or ')' in value or '\\' in value):
+        return b'(' + value.encode('ascii') + b')'
+    return transform_string(value).encode('utf-8')
+
+class Slot:
+    'Where a placeholder lives in the template: `width` bytes at `offset`, for field object `object_number`.'
+
+    def __init__(self, offset, width, kind, object_number):
+        self.offset = offset
+        self.width = width
+        self.kind = kind
+        self.object_number = object_number
+
+    def __repr__(self):
+        return 'Slot({} {} {}{})'.format(self.offset, self.width, self.kind, self.object_number)
+
+class CompiledTemplate:
+    '''
+    Built from a `Pdf` that has had `templatify_forms` run on it.
+
+    `fill` writes field values over the placeholders in a copy of the serialized template.
+    Values are keyed by field object number, like `templatify_forms_custom_padding` and the `templatify_forms` whitelist.
+    Text and choice values are strings, button values are names without the leading slash (e.g. `'Yes'`).
+    Fields without a value are left blank, or `Off` for buttons.
+    '''
+
+    def __init__(self, pdf):
+        file = io.BytesIO()
+        pdf.write(file)
+        self.template = file.getvalue()
+        self.slots = []
+        # _template_value: prefix, object number, uniquifier
+        pattern = re.compile(rb'[(/]([tgbc])(\d+)-' + re.escape(str(pdf.uniquifier).encode()))
+        for m in pattern.finditer(self.template):
+            kind = m.group(1).decode()
+            object_number = int(m.group(2))
+            end = m.end()
+            if kind != 'b':
+                if self.template[end:end + 1] != b')': continue
+                end += 1
+            width = end - m.start() + pdf._templatify_padding(Ref(object_number))
+            if self.template[end:m.start() + width].strip(b' '): continue
+            self.slots.append(Slot(m.start(), width, kind, object_number))
+        # slots by field, so each value is rendered once even if it appears in both the field and its appearance
+        self.fields = {}
+        for slot in self.slots:
+            self.fields.setdefault(slot.object_number, []).append(slot)
+        # the narrowest slot of each field, which its values have to fit
+        self.widths = {k: min(i.width for i in v) for k, v in self.fields.items()}
+        # fields in order, text and choice before buttons, so a fill can render them with `map`
+        self.texts = [k for k, v in self.fields.items() if v[0].kind != 'b']
+        self.buttons = [k for k, v in self.fields.items() if v[0].kind == 'b']
+        self.numbers = self.texts + self.buttons
+        self.limits = [self.widths[k] for k in self.numbers]
+        # the template as a format with a left-justified `%s` for each slot, so a fill is one `%`, with the rendered values
+        # gathered into slot order by an `itemgetter`
+        segments = []
+        position = 0
+        for slot in self.slots:
+            segments.append(self.template[position:slot.offset].replace(b'%', b'%%'))
+            segments.append(b'%-' + str(slot.width).encode() + b's')
+            position = slot.offset + slot.width
+        segments.append(self.template[position:].replace(b'%', b'%%'))
+        self.format = b''.join(segments)
+        index = {k: i for i, k in enumerate(self.numbers)}
+        indices = [index[i.object_number] for i in self.slots]
+        if len(indices) == 1:
+            self.gather = lambda rendered: (rendered[indices[0]],)
+        elif indices:
+            self.gather = operator.itemgetter(*indices)
+        else:
+            self.gather = lambda rendered: ()
+
+    def object_numbers(self):
+        return sorted(self.fields)
+
+    def fill(self, values):
+        'Return the filled PDF as `bytes`.'
+        texts = list(map(values.get, self.texts, itertools.repeat('')))
+        try: joined = ''.join(texts)
+        except TypeError: joined = None
+        # when no text needs escaping, which is the usual case, render them all without a call per value
+        if joined is not None and joined.isascii() and joined.isprintable() and not ('(' in joined or ')' in joined or '\\' in joined):
+            rendered = list(map(b'(%s)'.__mod__, map(str.encode, texts)))
+        else:
+            rendered = list(map(render, itertools.repeat('t'), texts))
+        rendered += map(render, itertools.repeat('b'), map(values.get, self.buttons))
+        if any(map(operator.gt, map(len, rendered), self.limits)):
+            lengths = dict(zip(self.numbers, map(len, rendered)))
+            for object_number in self.fields:
+                if lengths[object_number] > self.widths[object_number]:
+                    raise Exception('value for object {} is {} bytes, but its slot is only {} bytes; increase its padding'.format(
+                        object_number, lengths[object_number], self.widths[object_number],
+                    ))
+        return self.format % self.gather(rendered)
+
+    def save(self, file_name, values):
+        with open(file_name, 'wb') as file: file.write(self.fill(values))
@@ -18,34 +18,25 @@ def transform_typical(x):
 def transform_ref(x):
     return '{} R'.format(x)
 
+# strings with anything else are written as hexadecimal strings, p16 (7.3.4.3)
+pattern_unprintable = re.compile('[^{}]'.format(re.escape(string.printable)))
+
+# backslash first, so the escapes' own backslashes aren't escaped again
+string_escapes = [('\\', '\\\\'), ('(', '\\('), (')', '\\)')]
+
 def transform_string(x):
-    if any(i not in string.printable for i in x):
-        x = ''.join('{:02X}'.format(ord(i)) for i in x)
+    if pattern_unprintable.search(x):
+        try: x = x.encode('latin-1').hex().upper()
+        except UnicodeEncodeError: x = ''.join('{:02X}'.format(ord(i)) for i in x)
         return '<{}>'.format(x)
     else:
-        x = re.sub(r'([()\\])', r'\\\1', x)
+        for k, v in string_escapes:
+            if k in x: x = x.replace(k, v)
         return '({})'.format(x)
 
-def transform_dictionary(x):
-    result = b'<<'
-    for k, v in x.items():
-        result += transform_typical(Name(k)).encode('utf-8') + b' ' + to_bytes(v) + b' '
-    result += b'>>'
-    return result
-
-def transform_stream(x):
-    result = transform_dictionary(x.dictionary)
-    result += b'\nstream\r\n'
-    result += x.stream
-    result += b'\nendstream'
-    return result
-
-def transform_array(x):
-    result = b'['
-    for i in x:
-        result += to_bytes(i) + b' '
-    result += b']'
-    return result
+def transform_bytes(x):
+    # strings that aren't text, written as hexadecimal so any byte survives, p16 (7.3.4.3)
+    return '<{}>'.format(x.hex().upper())
 
 def transform_bool(x):
     return {True: 'true', False: 'false'}[x]
@@ -53,22 +44,98 @@ def transform_bool(x):
 def transform_null(x):
     return 'null'
 
-def transform_custom(x):
-    return to_bytes(x.object) + b' ' * x.padding
+class Output:
+    '''
+    Bytes to write as they are, as opposed to an object to serialize.
+    Containers don't produce bytes themselves.
+    Instead they push their delimiters and stream data as `Output`s and their elements onto the serializer's stack, last first.
+    Objects can be `bytes`, strings that aren't text, so output needs a class of its own.
+    '''
 
-def to_bytes(object):
-    result = {
-        Name: transform_typical,
-        Ref: transform_ref,
-        int: transform_typical,
-        float: transform_typical,
-        str: transform_string,
-        dict: transform_dictionary,
-        Stream: transform_stream,
-        list: transform_array,
-        bool: transform_bool,
-        None: transform_null,
-        Custom: transform_custom,
-    }[object.__class__](object)
-    if type(result) == str: result = result.encode('utf-8')
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+output_space = Output(b' ')
+output_dictionary_start = Output(b'<<')
+output_dictionary_end = Output(b'>>')
+output_array_start = Output(b'[')
+output_array_end = Output(b']')
+output_stream_start = Output(b'\nstream\r\n')
+output_stream_end = Output(b'\nendstream')
+
+name_cache = {}
+
+def transform_name_key(k):
+    result = name_cache.get(k)
+    if result is None:
+        result = name_cache[k] = Output(transform_typical(Name(k)).encode('utf-8') + b' ')
     return result
+
+def expand_dictionary(x, stack):
+    stack.append(output_dictionary_end)
+    for k, v in reversed(x.items()):
+        stack.append(output_space)
+        stack.append(v)
+        stack.append(transform_name_key(k))
+    stack.append(output_dictionary_start)
+
+def expand_stream(x, stack):
+    stack.append(output_stream_end)
+    stack.append(Output(x.stream))
+    stack.append(output_stream_start)
+    expand_dictionary(x.dictionary, stack)
+
+def expand_array(x, stack):
+    stack.append(output_array_end)
+    for i in reversed(x):
+        stack.append(output_space)
+        stack.append(i)
+    stack.append(output_array_start)
+
+def expand_custom(x, stack):
+    stack.append(Output(b' ' * x.padding))
+    stack.append(x.object)
+
+transforms = {
+    Name: transform_typical,
+    Ref: transform_ref,
+    int: transform_typical,
+    float: transform_typical,
+    str: transform_string,
+    bytes: transform_bytes,
+    bool: transform_bool,
+    type(None): transform_null,
+}
+
+expansions = {
+    dict: expand_dictionary,
+    Stream: expand_stream,
+    list: expand_array,
+    Custom: expand_custom,
+}
+
+def write_bytes(object, write):
+    '''
+    Serialize `object` by calling `write` with successive pieces of bytes.
+    Iterative, so deep nesting costs no recursion and output is never concatenated.
+    Stream data that's a view into a memory-mapped file is written straight from the mapping.
+    '''
+    stack = [object]
+    while stack:
+        x = stack.pop()
+        cls = x.__class__
+        if cls is Output:
+            write(x.data)
+            continue
+        expansion = expansions.get(cls)
+        if expansion:
+            expansion(x, stack)
+            continue
+        write(transforms[cls](x).encode('utf-8'))
+
+def to_bytes(object):
+    result = []
+    write_bytes(object, result.append)
+    return b''.join(result)